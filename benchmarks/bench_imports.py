@@ -0,0 +1,55 @@
+"""
+Benchmarks for the import time of the analysis modules, which should not
+load the PDF parsing backends.
+"""
+import subprocess
+import sys
+
+# the modules only needed to parse the raw PDFs
+PARSING_BACKENDS = ["camelot", "pdftotext", "PyPDF2", "cv2", "pdfminer"]
+
+
+def _import_times(module):
+    """
+    Return the cumulative import time (in seconds) of every module loaded
+    by importing the input module in a fresh interpreter.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    out = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:") :].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:  # the header
+            continue
+        out[fields[2].strip()] = cumulative / 1e6
+    return out
+
+
+class ImportAnalysis:
+    params = ["qcmr.analysis.cash", "qcmr.cash", "qcmr.raw"]
+    param_names = ["module"]
+    timeout = 120
+
+    def setup_cache(self):
+        return {module: _import_times(module) for module in self.params}
+
+    def track_import_time(self, times, module):
+        return times[module][module]
+
+    track_import_time.unit = "seconds"
+
+    def track_parsing_backends_loaded(self, times, module):
+        return sum(
+            name.split(".")[0] in PARSING_BACKENDS for name in times[module]
+        )
+
+    track_parsing_backends_loaded.unit = "modules"
@@ -0,0 +1,21 @@
+"""
+Benchmarks for loading the processed cash forecast data.
+"""
+from qcmr import raw
+
+
+class LoadCashForecasts:
+    params = raw.CASH_FORECAST_KINDS
+    param_names = ["kind"]
+
+    def time_load_cash_forecasts(self, kind):
+        raw.load_cash_forecasts(kind)
+
+    def time_read_quarterly_files(self, kind):
+        raw._read_quarterly_cash_forecasts(kind)
+
+
+class LoadAllCashForecasts:
+    def time_load_all_kinds(self):
+        for kind in raw.CASH_FORECAST_KINDS:
+            raw.load_cash_forecasts(kind)
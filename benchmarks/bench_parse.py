@@ -0,0 +1,135 @@
+"""
+Benchmarks for finding and parsing the tables in the raw QCMR PDFs.
+
+The on-disk caches (page-text indices, cash forecast layouts, and raw
+camelot tables) are redirected to a temporary folder, so each benchmark
+controls whether they are warm.
+"""
+from qcmr.parse import utils
+from qcmr.parse.core import QCMR
+from qcmr.parse.session import ExtractionSession
+from qcmr.parse.tables import cash_forecast, leave_usage, general_fund_obligations
+import os
+import shutil
+import tempfile
+
+# the reports to benchmark: an older layout and the latest one
+REPORTS = ["FY16_Q4", "FY20_Q2"]
+
+
+def _get_pdf_path(report):
+    return os.path.join(utils.data_dir, "raw", f"{report}.pdf")
+
+
+class CacheMixin:
+    """
+    Point the parsing caches at a temporary folder for each repeat.
+    """
+
+    def setup(self, *args):
+        self._cache_dir = utils.cache_dir
+        self._hints_dir = cash_forecast.LAYOUT_HINTS_DIR
+
+        self.tmpdir = tempfile.mkdtemp()
+        utils.cache_dir = self.tmpdir
+        cash_forecast.LAYOUT_HINTS_DIR = os.path.join(
+            self.tmpdir, "layouts", "cash_forecast"
+        )
+        self.clear_memory()
+
+    def teardown(self, *args):
+        utils.cache_dir = self._cache_dir
+        cash_forecast.LAYOUT_HINTS_DIR = self._hints_dir
+        self.clear_memory()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def clear_memory(self):
+        for doc in utils._documents.values():
+            doc.close()
+        utils._documents.clear()
+
+
+class GetPages(CacheMixin):
+    params = (REPORTS, ["cold", "disk"])
+    param_names = ["report", "index"]
+    number = 1
+    warmup_time = 0
+    timeout = 300
+
+    def setup(self, report, index):
+        super().setup(report, index)
+        self.pdf_path = _get_pdf_path(report)
+
+        # build the on-disk index, but nothing in memory
+        if index == "disk":
+            utils.get_page_index(self.pdf_path)
+            self.clear_memory()
+
+    def time_get_pages(self, report, index):
+        utils.get_pages(self.pdf_path, QCMR.page_tags, limits=QCMR.page_counts)
+
+
+class ParseTables(CacheMixin):
+    params = (REPORTS, ["cold", "cached"])
+    param_names = ["report", "tables"]
+    number = 1
+    warmup_time = 0
+    timeout = 900
+
+    def setup(self, report, tables):
+        super().setup(report, tables)
+        self.pdf_path = _get_pdf_path(report)
+        self.pages = utils.get_pages(
+            self.pdf_path, QCMR.page_tags, limits=QCMR.page_counts
+        )
+
+        # cache the raw camelot tables first
+        if tables == "cached":
+            for module in [leave_usage, general_fund_obligations]:
+                name = module.__name__.split(".")[-1]
+                requests = module.get_requests(self.pages[name], self.pdf_path)
+                ExtractionSession(self.pdf_path).prefetch(requests)
+
+    def time_leave_usage(self, report, tables):
+        leave_usage.parse(
+            QCMR.titles["leave_usage"], self.pdf_path, self.pages["leave_usage"]
+        )
+
+    def time_general_fund_obligations(self, report, tables):
+        general_fund_obligations.parse(
+            QCMR.titles["general_fund_obligations"],
+            self.pdf_path,
+            self.pages["general_fund_obligations"],
+        )
+
+
+class ParseCashForecast(CacheMixin):
+    params = (REPORTS, ["none", "learned", "cached"])
+    param_names = ["report", "layout"]
+    number = 1
+    warmup_time = 0
+    timeout = 900
+
+    def setup(self, report, layout):
+        super().setup(report, layout)
+        self.pdf_path = _get_pdf_path(report)
+        self.pages = utils.get_pages(
+            self.pdf_path, QCMR.page_tags, limits=QCMR.page_counts
+        )["cash_forecast"]
+
+        # learn the layout hints (and cache the raw tables read with them)
+        if layout in ["learned", "cached"]:
+            self.parse()
+            self.parse()
+
+        # only keep the layout hints
+        if layout == "learned":
+            shutil.rmtree(os.path.join(self.tmpdir, "camelot"))
+
+    def parse(self):
+        cash_forecast.parse(
+            QCMR.titles["cash_forecast"], self.pdf_path, self.pages, missing="nan"
+        )
+
+    def time_cash_forecast(self, report, layout):
+        self.parse()
@@ -0,0 +1,95 @@
+"""
+Benchmarks for the CashReport analysis methods.
+
+The cash data is loaded once, in the setup of each benchmark, so these time
+the analysis itself rather than reading the processed files.
+"""
+from qcmr import cash
+from qcmr.analysis.cash import CashReport
+from qcmr.other import load_end_of_year_fund_balance_revisions
+
+# the (fiscal year, quarter) of the reports to benchmark
+QUARTERS = ["2020-Q1", "2020-Q2"]
+
+
+class CashReportMethods:
+    params = QUARTERS
+    param_names = ["report"]
+
+    def setup(self, report):
+        year, quarter = report.split("-Q")
+        self.report = CashReport(int(year), int(quarter))
+
+        # load the data panels
+        for kind in CashReport.loaders:
+            self.report._get_data(kind)
+
+    def time_compare_to_last_quarter(self, report):
+        self.report.compare_to_last_quarter()
+
+    def time_compare_to_first_quarter(self, report):
+        if self.report.quarter != 1:
+            self.report.compare_to_first_quarter()
+
+    def time_compare_to_last_year(self, report):
+        self.report.compare_to_last_year()
+
+    def time_actual_vs_projected_changes(self, report):
+        self.report.actual_vs_projected_changes()
+
+    def time_actual_vs_projected_changes_by_quarter(self, report):
+        self.report.actual_vs_projected_changes_by_quarter()
+
+    def time_historical_balance_by_quarter(self, report):
+        self.report.historical_balance_by_quarter()
+
+    def time_annual_general_fund_totals(self, report):
+        self.report.annual_general_fund_totals()
+
+    def time_compare_totals_by_quarter(self, report):
+        self.report.compare_totals_by_quarter([1, 2, 3, 4])
+
+    def time_build_all(self, report):
+        self.report.build_all()
+
+
+class ProjectionAccuracy:
+    params = (QUARTERS, ["Fund Balance", "Revenue", "Spending"])
+    param_names = ["report", "kind"]
+
+    def setup(self, report, kind):
+        year, quarter = report.split("-Q")
+        self.report = CashReport(int(year), int(quarter))
+        self.report._get_data(kind)
+
+    def time_annual_projection_accuracy(self, report, kind):
+        self.report.annual_projection_accuracy(kind)
+
+    def time_projection_accuracy(self, report, kind):
+        self.report.projection_accuracy(kind)
+
+
+class FundBalanceRevisions:
+    def setup(self):
+        try:
+            load_end_of_year_fund_balance_revisions()
+        except FileNotFoundError:
+            raise NotImplementedError("fund balance revisions data is not available")
+        self.report = CashReport(2020, 2)
+
+    def time_fund_balance_revisions(self):
+        self.report.fund_balance_revisions()
+
+
+class BuildAllFromDisk:
+    params = QUARTERS
+    param_names = ["report"]
+    number = 1
+
+    def setup(self, report):
+        year, quarter = report.split("-Q")
+        self.report = CashReport(int(year), int(quarter))
+        cash.clear_cache()
+
+    def time_build_all(self, report):
+        self.report.build_all()
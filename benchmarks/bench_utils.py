@@ -0,0 +1,68 @@
+"""
+Benchmarks for the string cleaning helpers in qcmr.parse.utils, compared
+against the column-by-column implementations they replaced.
+"""
+from qcmr.parse import utils
+import numpy as np
+import pandas as pd
+
+
+def _legacy_convert_to_floats(df, usecols=None, errors="coerce"):
+    if usecols is None:
+        usecols = df.columns
+
+    for col in usecols:
+        df[col] = pd.to_numeric(
+            df[col].replace(r"[\$,)]", "", regex=True).replace("[(]", "-", regex=True),
+            errors=errors,
+        )
+    return df
+
+
+def _legacy_remove_empty_columns(df):
+    for col in df.columns:
+        invalid = df[col].isin(["", "."]).all()
+        if invalid:
+            df = df.drop(labels=[col], axis=1)
+    return df
+
+
+def _make_table(nrows, ncols=16, seed=42):
+    """
+    Make a table of strings that looks like raw camelot output, with a
+    category column, empty spacer columns, and currency-formatted values.
+    """
+    rng = np.random.RandomState(seed)
+    values = rng.normal(scale=500, size=(nrows, ncols)).round(1)
+
+    def fmt(x):
+        s = f"{abs(x):,.1f}"
+        return f"({s})" if x < 0 else f"${s}"
+
+    df = pd.DataFrame(np.vectorize(fmt)(values))
+    df[rng.rand(nrows, ncols) < 0.05] = ""
+    df[2] = ""
+    df[7] = "."
+    df.insert(0, "category", [f"Category {i}" for i in range(nrows)])
+    df.columns = range(ncols + 1)
+    return df
+
+
+class CleanTable:
+    params = [40, 400]
+    param_names = ["rows"]
+
+    def setup(self, rows):
+        self.df = _make_table(rows)
+
+    def time_convert_to_floats(self, rows):
+        utils.convert_to_floats(self.df.copy(), usecols=self.df.columns[1:])
+
+    def time_convert_to_floats_legacy(self, rows):
+        _legacy_convert_to_floats(self.df.copy(), usecols=self.df.columns[1:])
+
+    def time_remove_empty_columns(self, rows):
+        utils.remove_empty_columns(self.df)
+
+    def time_remove_empty_columns_legacy(self, rows):
+        _legacy_remove_empty_columns(self.df)
@@ -1,8 +1,15 @@
+from ...cash import PANEL_INDEX, PANEL_KEY, get_panel_key
 import pandas as pd
 import numpy as np
 
+# the calendar months, in fiscal year order
+FISCAL_MONTHS = [7, 8, 9, 10, 11, 12, 1, 2, 3, 4, 5, 6]
+
 
 def this_year(df, year, quarter):
+    if _is_panel(df):
+        return _take(df, [(year, quarter)], FISCAL_MONTHS)
+
     sel = df["fiscal_year"] == year
     sel &= df["quarter"] == quarter
     return df.loc[sel]
@@ -18,15 +25,121 @@ def last_quarter(df, year, quarter):
         quarter = 4
     else:
         quarter = quarter - 1
-    sel = df["fiscal_year"] == year
-    sel &= df["quarter"] == quarter
-    return df.loc[sel]
+    return this_year(df, year, quarter)
 
 
 def last_year(df, year):
-    sel = df["fiscal_year"] == year
-    sel &= df["quarter"] == 4
-    return df.loc[sel]
+    return this_year(df, year, 4)
+
+
+def latest_vintages(df, fiscal_year, quarter, months=None):
+    """
+    Select the data from the input quarter for the current fiscal year, and
+    the data from quarter 4 (the actuals) for all other fiscal years.
+
+    Parameters
+    ----------
+    df : DataFrame
+        the cash data, or a panel of it (see :func:`qcmr.cash.to_panel`)
+    fiscal_year : int
+        the current fiscal year
+    quarter : int
+        the current quarter
+    months : list of int, optional
+        only select these calendar months; default is all months
+    """
+    if months is None:
+        months = FISCAL_MONTHS
+
+    if _is_panel(df):
+        if not len(df):
+            return df.reset_index(drop=True)
+
+        # the range of fiscal years, from the first and last keys
+        first, last = df.index[[0, -1]] // 1000
+        keys = [
+            (fy, quarter if fy == fiscal_year else 4) for fy in range(first, last + 1)
+        ]
+        return _take(df, keys, months)
+
+    valid = (df["fiscal_year"] == fiscal_year) & (df["quarter"] == quarter)
+    valid |= (df["fiscal_year"] != fiscal_year) & (df["quarter"] == 4)
+    valid &= df["month"].isin(months)
+    return df.loc[valid]
+
+
+def _is_panel(df):
+    """
+    Internal function to test if the input data is a panel.
+    """
+    return df.index.name == PANEL_KEY
+
+
+def _take(panel, keys, months):
+    """
+    Internal function to select the input months for each (fiscal_year,
+    quarter) key from a panel, in order, using a binary search of its
+    sorted keys; missing rows are skipped.
+    """
+    index = panel.index.to_numpy()
+    if not len(index):
+        return panel.reset_index(drop=True)
+
+    fiscal_years, quarters = zip(*keys)
+    targets = get_panel_key(
+        np.repeat(fiscal_years, len(months)),
+        np.repeat(quarters, len(months)),
+        np.tile(months, len(keys)),
+    ).astype(index.dtype)
+    positions = np.searchsorted(index, targets).clip(max=len(index) - 1)
+    positions = positions[index[positions] == targets]
+
+    return panel.iloc[positions].reset_index(drop=True)
+
+
+def compare_vintages(df, this, other, labels, columns=[]):
+    """
+    Compare the monthly cash projections from two vintages, e.g., two
+    (fiscal year, quarter) reports.
+
+    All columns are compared at once, returning one row per column and
+    fiscal month.
+
+    Parameters
+    ----------
+    df : DataFrame
+        the data frame holding all historical cash flow data
+    this : tuple of (int, int)
+        the (fiscal year, quarter) of the first vintage
+    other : tuple of (int, int)
+        the (fiscal year, quarter) of the vintage to compare to
+    labels : tuple of (str, str)
+        the names of the output columns holding the values of each vintage
+    columns : list, optional
+        only compare the values for these columns; if not provided, all columns
+        will be compared
+
+    Returns
+    -------
+    DataFrame :
+        the comparison, with columns "fiscal_month", "month", the two
+        vintage labels, and "Name"
+    """
+    if not len(columns):
+        columns = [c for c in df.columns if c not in PANEL_INDEX]
+
+    out = []
+    for (year, quarter), label in zip([this, other], labels):
+        X = this_year(df, year, quarter).set_index("month")[columns]
+        X = X.reindex(FISCAL_MONTHS).rename_axis("month").reset_index()
+        X.insert(0, "fiscal_month", np.arange(1, 13))
+        out.append(X.melt(id_vars=["fiscal_month", "month"], var_name="Name"))
+
+    # the two vintages share the same row order after melting
+    out[0][labels[1]] = out[1]["value"].values
+    out = out[0].rename(columns={"value": labels[0]})
+
+    return out[["fiscal_month", "month", labels[0], labels[1], "Name"]]
 
 
 def to_first_quarter(df, year, quarter, columns=[]):
@@ -47,37 +160,8 @@ def to_first_quarter(df, year, quarter, columns=[]):
     """
     assert quarter != 1
 
-    COLS = {}
-    COLS["This Quarter"] = f"FY{str(year)[-2:]} Q{quarter}"
-    COLS["First Quarter"] = f"FY{str(year)[-2:]} Q1"
-
-    if not len(columns):
-        columns = list(set(df.columns) - set(["month", "fiscal_year", "quarter"]))
-    out = []
-    for col in columns:
-
-        dfs = []
-        for tag in ["This Quarter", "First Quarter"]:
-            if tag == "This Quarter":
-                X = this_quarter(df, year, quarter)
-            else:
-                X = this_quarter(df, year, 1)
-            X = X[["month", col]]
-            X = X.set_index("month").rename(columns={col: COLS[tag]})
-            dfs.append(X)
-
-        this = pd.concat(dfs, axis=1)
-
-        # order by fiscal month
-        order = list(np.arange(6, 6 + 12, 1) % 12 + 1)
-
-        this = this.loc[order].reset_index()
-        this = this.reset_index().rename(columns={"index": "fiscal_month"})
-        this["fiscal_month"] += 1
-        this["Name"] = col
-
-        out.append(this)
-    return pd.concat(out, axis=0).reset_index(drop=True)
+    labels = [f"FY{str(year)[-2:]} Q{quarter}", f"FY{str(year)[-2:]} Q1"]
+    return compare_vintages(df, (year, quarter), (year, 1), labels, columns=columns)
 
 
 def to_last_quarter(df, year, quarter, columns=[]):
@@ -95,40 +179,13 @@ def to_last_quarter(df, year, quarter, columns=[]):
         only compare the values for these columns; if not provided, all columns
         will be compared
     """
-    COLS = {}
-    COLS["This Quarter"] = f"FY{str(year)[-2:]} Q{quarter}"
     if quarter == 1:
-        COLS["Last Quarter"] = f"FY{str(year-1)[-2:]} Q4"
+        last = (year - 1, 4)
     else:
-        COLS["Last Quarter"] = f"FY{str(year)[-2:]} Q{quarter-1}"
-
-    if not len(columns):
-        columns = list(set(df.columns) - set(["month", "fiscal_year", "quarter"]))
-    out = []
-    for col in columns:
-
-        dfs = []
-        for tag in ["This Quarter", "Last Quarter"]:
-            if tag == "This Quarter":
-                X = this_quarter(df, year, quarter)
-            else:
-                X = last_quarter(df, year, quarter)
-            X = X[["month", col]]
-            X = X.set_index("month").rename(columns={col: COLS[tag]})
-            dfs.append(X)
+        last = (year, quarter - 1)
 
-        this = pd.concat(dfs, axis=1)
-
-        # order by fiscal month
-        order = list(np.arange(6, 6 + 12, 1) % 12 + 1)
-
-        this = this.loc[order].reset_index()
-        this = this.reset_index().rename(columns={"index": "fiscal_month"})
-        this["fiscal_month"] += 1
-        this["Name"] = col
-
-        out.append(this)
-    return pd.concat(out, axis=0).reset_index(drop=True)
+    labels = [f"FY{str(year)[-2:]} Q{quarter}", f"FY{str(last[0])[-2:]} Q{last[1]}"]
+    return compare_vintages(df, (year, quarter), last, labels, columns=columns)
 
 
 def to_last_year(df, year, quarter, columns=[]):
@@ -146,37 +203,8 @@ def to_last_year(df, year, quarter, columns=[]):
         only compare the values for these columns; if not provided, all columns
         will be compared
     """
-    COLS = {}
-    COLS["This Year"] = "FY" + str(year)[-2:]
-    COLS["Last Year"] = "FY" + str(year - 1)[-2:]
-
-    if not len(columns):
-        columns = list(set(df.columns) - set(["month", "fiscal_year", "quarter"]))
-    out = []
-    for col in columns:
-
-        dfs = []
-        for tag in ["This Year", "Last Year"]:
-            if tag == "This Year":
-                X = this_year(df, year, quarter)
-            else:
-                X = last_year(df, year - 1)
-            X = X[["month", col]]
-            X = X.set_index("month").rename(columns={col: COLS[tag]})
-            dfs.append(X)
-
-        this = pd.concat(dfs, axis=1)
-
-        # order by fiscal month
-        order = list(np.arange(6, 6 + 12, 1) % 12 + 1)
-
-        this = this.loc[order].reset_index()
-        this = this.reset_index().rename(columns={"index": "fiscal_month"})
-        this["fiscal_month"] += 1
-        this["Name"] = col
-
-        out.append(this)
-    return pd.concat(out, axis=0).reset_index(drop=True)
+    labels = ["FY" + str(year)[-2:], "FY" + str(year - 1)[-2:]]
+    return compare_vintages(df, (year, quarter), (year - 1, 4), labels, columns=columns)
 
 
 def end_of_year_balances(df, fiscal_year, quarter):
@@ -193,13 +221,11 @@ def end_of_year_balances(df, fiscal_year, quarter):
         the quarter to get balances at end of
     """
     assert quarter in [1, 2, 3, 4]
-    valid = (df["fiscal_year"] == fiscal_year) & (df["quarter"] == quarter)
-    valid |= (df["fiscal_year"] != fiscal_year) & (df["quarter"] == 4)
 
     # select the right month
-    valid &= df["month"] == 6
+    df = latest_vintages(df, fiscal_year, quarter, months=[6])
 
-    return df.loc[valid].set_index("fiscal_year")
+    return df.set_index("fiscal_year")
 
 
 def end_of_quarter_balances(df, fiscal_year, quarter):
@@ -216,8 +242,6 @@ def end_of_quarter_balances(df, fiscal_year, quarter):
         the quarter to get balances at end of
     """
     assert quarter in [1, 2, 3, 4]
-    valid = (df["fiscal_year"] == fiscal_year) & (df["quarter"] == quarter)
-    valid |= (df["fiscal_year"] != fiscal_year) & (df["quarter"] == 4)
 
     # select the right month
     if quarter == 1:
@@ -228,9 +252,9 @@ def end_of_quarter_balances(df, fiscal_year, quarter):
         month = 3
     else:
         month = 6
-    valid &= df["month"] == month
+    df = latest_vintages(df, fiscal_year, quarter, months=[month])
 
-    return df.loc[valid].set_index("fiscal_year")
+    return df.set_index("fiscal_year")
 
 
 def sum_over_quarters(df, this_year, this_quarter, quarters):
@@ -241,21 +265,104 @@ def sum_over_quarters(df, this_year, this_quarter, quarters):
     For the past fiscal year, use actuals (from quarter 4), while
     the current fiscal year / quarter may contain projected values.
     """
-
-    valid = (df["fiscal_year"] == this_year) & (df["quarter"] == this_quarter)
-    valid |= (df["fiscal_year"] != this_year) & (df["quarter"] == 4)
-    df = df.loc[valid]
-
     # select the right months for this quarter
     min_quarter = min(quarters)
     max_quarter = max(quarters)
     start_month = (7 + (min_quarter - 1) * 3) % 12
     end_month = (9 + (max_quarter - 1) * 3) % 12
-    valid = (df["month"] >= start_month) & (df["month"] <= end_month)
+    months = [m for m in FISCAL_MONTHS if m >= start_month and m <= end_month]
 
     # do the selection
-    df = df.loc[valid]
+    df = latest_vintages(df, this_year, this_quarter, months=months)
 
     # do the sum over the quarter
     cols = set(df.columns) - set(["fiscal_year", "quarter", "year", "month"])
     return df.groupby("fiscal_year")[list(cols)].sum()
+
+
+def annual_projection_errors(df, how="sum"):
+    """
+    Calculate the difference between the actual annual values and the
+    annual values projected in every quarter, for all columns and fiscal
+    years at once.
+
+    Parameters
+    ----------
+    df : DataFrame
+        the data frame holding all historical cash flow data
+    how : 'sum', 'end', optional
+        whether the annual value is the sum over all months (for revenues
+        and spending) or the end-of-year value (for fund balances)
+
+    Returns
+    -------
+    DataFrame :
+        the differences, with columns "fiscal_year", "quarter", "Name",
+        and "Actual - Projection"; the actual values are the quarter 4 values
+    """
+    assert how in ["sum", "end"]
+    if _is_panel(df):
+        df = df.reset_index(drop=True)
+    columns = [c for c in df.columns if c not in PANEL_INDEX]
+
+    # the annual values, for every fiscal year and quarter
+    if how == "end":
+        annual = df.loc[df["month"] == 6].set_index(["fiscal_year", "quarter"])
+        annual = annual[columns]
+    else:
+        annual = df.groupby(["fiscal_year", "quarter"])[columns].sum()
+
+    # subtract from the actual value for each fiscal year
+    actual = annual.xs(4, level="quarter")
+    actual = actual.reindex(annual.index.get_level_values("fiscal_year"))
+    diff = pd.DataFrame(
+        actual.values - annual.values, index=annual.index, columns=columns
+    )
+
+    out = diff.rename_axis("Name", axis=1).stack().rename("Actual - Projection")
+    return out.reset_index()[
+        ["fiscal_year", "quarter", "Name", "Actual - Projection"]
+    ].dropna()
+
+
+def annual_changes(df):
+    """
+    Calculate the change in annual totals projected in every quarter from
+    the prior fiscal year's actual (quarter 4) totals, for all columns and
+    fiscal years at once.
+
+    Parameters
+    ----------
+    df : DataFrame
+        the data frame holding all historical cash flow data
+
+    Returns
+    -------
+    DataFrame :
+        the changes, with columns "fiscal_year", "quarter", "Name", "Change
+        (Percent)", and "Change"
+    """
+    if _is_panel(df):
+        df = df.reset_index(drop=True)
+    columns = [c for c in df.columns if c not in PANEL_INDEX]
+
+    # the annual totals, for every fiscal year and quarter
+    totals = df.groupby(["fiscal_year", "quarter"])[columns].sum()
+
+    # the prior year's actual totals
+    prior = totals.xs(4, level="quarter")
+    prior.index += 1
+    prior = prior.reindex(totals.index.get_level_values("fiscal_year"))
+    prior.index = totals.index
+
+    diff = totals - prior
+    change = diff / prior
+
+    out = pd.concat(
+        [
+            change.rename_axis("Name", axis=1).stack().rename("Change (Percent)"),
+            diff.rename_axis("Name", axis=1).stack().rename("Change"),
+        ],
+        axis=1,
+    )
+    return out.reset_index()
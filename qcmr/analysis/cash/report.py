@@ -1,7 +1,9 @@
 from . import compare
+from .stats import bootstrap_linear_fit, percentile_interval
 from ...cash import *
 from ...other import *
 import calendar
+import os
 import pandas as pd
 import numpy as np
 
@@ -19,31 +21,97 @@ class CashReport(object):
         the quarter being analyzed
     """
 
+    # the functions to load each kind of data
+    loaders = {
+        "Revenue": get_GF_revenues,
+        "Spending": get_GF_spending,
+        "Fund Balance": get_fund_balances,
+        "Balance Sheet": get_GF_balance_sheet,
+    }
+
     def __init__(self, year, quarter):
 
         assert quarter in [1, 2, 3, 4]
         self.year = year
         self.quarter = quarter
 
+        # the data panels loaded so far, keyed by kind
+        self._panels = {}
+
+    def build_all(self, output_dir=None, quarters=None):
+        """
+        Calculate every output of the quarterly cash report.
+
+        Each kind of data is loaded once and shared between all of the
+        outputs, and the projection accuracy and changes are computed once
+        for all quarters.
+
+        Parameters
+        ----------
+        output_dir : str, optional
+            if provided, write each output to a CSV file in this folder
+        quarters : list of int, optional
+            the quarters to pass to :func:`compare_totals_by_quarter`;
+            default is the current quarter
+
+        Returns
+        -------
+        dict :
+            the outputs, keyed by name
+        """
+        if quarters is None:
+            quarters = [self.quarter]
+
+        out = {}
+        out["compare_to_last_quarter"] = self.compare_to_last_quarter()
+        if self.quarter != 1:
+            out["compare_to_first_quarter"] = self.compare_to_first_quarter()
+        out["compare_to_last_year"] = self.compare_to_last_year()
+
+        # projection accuracy
+        for kind in ["Fund Balance", "Revenue", "Spending"]:
+            name = "annual_projection_accuracy_" + kind.lower().replace(" ", "_")
+            out[name] = self._select_projection_accuracy(
+                self.projection_accuracy(kind)
+            )
+
+        out["actual_vs_projected_changes"] = self._select_changes(
+            self.actual_vs_projected_changes_by_quarter()
+        )
+        out["historical_balance_by_quarter"] = self.historical_balance_by_quarter()
+        out["annual_general_fund_totals"] = self.annual_general_fund_totals()
+        out["compare_totals_by_quarter"] = self.compare_totals_by_quarter(quarters)
+
+        # write
+        if output_dir is not None:
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+            for name, df in out.items():
+                df.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+
+        return out
+
+    def _get_data(self, kind):
+        """
+        Internal function to return the data panel for a kind, loading it
+        the first time it is needed.
+        """
+        if kind not in self._panels:
+            self._panels[kind] = self.loaders[kind](indexed=True)
+        return self._panels[kind]
+
     def fund_balance_revisions(self, xmin=-200, xmax=1100):
         """
         Estimate the relationship between the modified accrual fund balance
         and the Q4 cash balance.
         """
-        from seaborn.algorithms import bootstrap
-        from seaborn.utils import ci
-
         # load the data
         df = load_end_of_year_fund_balance_revisions()
         df["Q1 Actual"] /= 1e3
 
-        def reg_func(_x, _y):
-            return np.linalg.pinv(_x).dot(_y)
-
         # Setup the regression
-        XX = df.dropna().copy()
-        XX["const"] = 1
-        X = XX[["const", "Q4 Cash Balance"]].values
+        XX = df.dropna()
+        x = XX["Q4 Cash Balance"].values
         y = XX["Q1 Actual"].values
 
         # Bootstrap and error bands
@@ -55,9 +123,9 @@ class CashReport(object):
 
         grid = np.vstack([np.ones(len(Xs)), Xs]).T
 
-        beta_boots = bootstrap(X, y, func=reg_func, n_boot=10000, random_seed=42).T
+        beta_boots = bootstrap_linear_fit(x, y, n_boot=10000, seed=42)
         yhat_boots = grid.dot(beta_boots).T
-        err_bands = ci(yhat_boots, axis=0)
+        err_bands = percentile_interval(yhat_boots, axis=0)
 
         out = df.copy()
         out = out[["Year", "Q4 Cash Balance", "Q1 Actual"]]
@@ -103,14 +171,13 @@ class CashReport(object):
         elif kind == "first-quarter":
             comparison = compare.to_first_quarter
 
-        funcs = [get_GF_spending, get_GF_revenues, get_fund_balances]
         labels = ["Spending", "Revenue", "Fund Balance"]
         out = []
 
-        for label, func in zip(labels, funcs):
+        for label in labels:
 
             # get the data for this type
-            df = func()
+            df = self._get_data(label)
 
             # perform the comparison
             compared = comparison(df, self.year, self.quarter)
@@ -142,48 +209,46 @@ class CashReport(object):
         kind : ['Fund Balance', 'Revenue', 'Spending']
             the type of data to return
         """
-        assert kind in ["Fund Balance", "Revenue", "Spending"]
+        return self._select_projection_accuracy(self.projection_accuracy(kind))
 
-        # get the fund balance data
-        if kind == "Fund Balance":
-            X = get_fund_balances()
-        elif kind == "Revenue":
-            X = get_GF_revenues()
-        elif kind == "Spending":
-            X = get_GF_spending()
+    def _select_projection_accuracy(self, out):
+        """
+        Internal function to select the current quarter from the output
+        of :func:`projection_accuracy`.
+        """
+        out = out.loc[out["Quarter"] == self.quarter]
 
-        # loop over
-        out = []
-        columns = list(set(X.columns) - set(["month", "fiscal_year", "quarter"]))
-        for col in columns:
-
-            # actual
-            sel = X["quarter"] == 4
-            if kind == "Fund Balance":
-                sel &= X["month"] == 6
-                actual = X.loc[sel, ["fiscal_year", col]]
-                actual = actual.set_index("fiscal_year").squeeze()
-            else:
-                actual = X.loc[sel].groupby("fiscal_year")[col].sum()
-
-            # projected
-            sel = X["quarter"] == self.quarter
-            if kind == "Fund Balance":
-                sel &= X["month"] == 6
-                proj = X.loc[sel, ["fiscal_year", col]]
-                proj = proj.set_index("fiscal_year").squeeze()
-            else:
-                proj = X.loc[sel].groupby("fiscal_year")[col].sum()
-
-            # calculate difference
-            diff = (actual - proj).to_frame(f"Actual - Q{self.quarter} Projection")
-            diff["Name"] = col
-            diff = diff.reset_index()
-            out.append(diff)
+        label = f"Actual - Q{self.quarter} Projection"
+        out = out.rename(columns={"Actual - Projection": label})
+        return out[["Fiscal Year", label, "Name"]].reset_index(drop=True)
 
-        out = pd.concat(out, axis=0).reset_index(drop=True)
-        out = out.rename(columns={"fiscal_year": "Fiscal Year"})
-        return out.dropna()
+    def projection_accuracy(self, kind):
+        """
+        Calculate the historical accuracy of annual, year-end projections
+        from every quarter.
+
+        This is the same as :func:`annual_projection_accuracy`, computed
+        for quarters 1 through 4 at once.
+
+        Parameters
+        ----------
+        kind : ['Fund Balance', 'Revenue', 'Spending']
+            the type of data to return
+
+        Returns
+        -------
+        DataFrame :
+            the accuracy, with columns "Fiscal Year", "Quarter", "Name", and
+            "Actual - Projection"
+        """
+        assert kind in ["Fund Balance", "Revenue", "Spending"]
+
+        # get the data
+        X = self._get_data(kind)
+
+        how = "end" if kind == "Fund Balance" else "sum"
+        out = compare.annual_projection_errors(X, how=how)
+        return out.rename(columns={"fiscal_year": "Fiscal Year", "quarter": "Quarter"})
 
     def actual_vs_projected_changes(self):
         """
@@ -193,58 +258,73 @@ class CashReport(object):
         For each spending/revenue category, columns 'Actual Change' and
         'Projected Change' will be calculated.
         """
+        return self._select_changes(self.actual_vs_projected_changes_by_quarter())
 
-        def calculate_difference(df, quarter, label, columns):
-            X = df.loc[(df["quarter"] == quarter)].groupby("fiscal_year")[columns].sum()
-            Y = df.loc[(df["quarter"] == 4)].groupby("fiscal_year")[columns].sum()
-            Y.index += 1
-            diff = X - Y
-            change = diff / Y
+    def _select_changes(self, out):
+        """
+        Internal function to select the current quarter from the output
+        of :func:`actual_vs_projected_changes_by_quarter`.
+        """
+        return out.loc[[self.quarter]].reset_index(drop=True)
 
-            diff = diff.reset_index().melt(
-                id_vars="fiscal_year", var_name="Name", value_name=f"{label} Change"
-            )
-            change = change.reset_index().melt(
-                id_vars="fiscal_year",
-                var_name="Name",
-                value_name=f"{label} Change (Percent)",
-            )
-            return pd.merge(change, diff, on=["fiscal_year", "Name"])
+    def actual_vs_projected_changes_by_quarter(self):
+        """
+        Compare the actual and projected changes for the General Fund
+        cash revenue and spending categories, for the projections from
+        every quarter.
+
+        This is the same as :func:`actual_vs_projected_changes`, computed
+        for quarters 1 through 4 at once.
 
+        Returns
+        -------
+        DataFrame :
+            the changes, indexed by "Quarter"
+        """
         labels = ["Revenue", "Spending"]
 
         toret = []
         for i, label in enumerate(labels):
 
-            if label == "Revenue":
-                df = get_GF_revenues()
-            elif label == "Spending":
-                df = get_GF_spending()
-            columns = list(set(df.columns) - set(["month", "fiscal_year", "quarter"]))
+            df = self._get_data(label)
 
-            # projected
-            projected = calculate_difference(df, self.quarter, "Projected", columns)
+            # the changes projected in every quarter
+            changes = compare.annual_changes(df)
+            projected = changes.rename(
+                columns={
+                    "Change": "Projected Change",
+                    "Change (Percent)": "Projected Change (Percent)",
+                }
+            )
 
-            # actual
-            actual = calculate_difference(df, 4, "Actual", columns)
+            # the actual changes, from quarter 4
+            actual = changes.loc[changes["quarter"] == 4].drop(columns="quarter")
+            actual = actual.rename(
+                columns={
+                    "Change": "Actual Change",
+                    "Change (Percent)": "Actual Change (Percent)",
+                }
+            )
 
             # combine
-            out = pd.merge(actual, projected, on=["fiscal_year", "Name"])
+            out = pd.merge(actual, projected, on=["fiscal_year", "Name"], how="right")
             out["Kind"] = label
             out = out.dropna(subset=["Projected Change"])
             out = out.rename(columns={"fiscal_year": "Fiscal Year"})
             toret.append(out)
 
         # return revenue + spendimg
-        out = pd.concat(toret, axis=0).reset_index(drop=True)
+        out = pd.concat(toret, axis=0)
+        out = out.rename(columns={"quarter": "Quarter"}).set_index("Quarter")
+        out = out.sort_index(kind="stable")
 
         # hide FY15 by default for Q1
-        if self.quarter == 1:
-            fy15 = out["Fiscal Year"] == 2015
-            valid = fy15 & (
-                out["Name"].isin(["Total Disbursements", "Total Cash Receipts"])
-            )
-            out.loc[valid, ["Projected Change (Percent)", "Projected Change"]] = np.nan
+        fy15 = out["Fiscal Year"] == 2015
+        valid = fy15 & (
+            out["Name"].isin(["Total Disbursements", "Total Cash Receipts"])
+        )
+        valid &= out.index == 1
+        out.loc[valid, ["Projected Change (Percent)", "Projected Change"]] = np.nan
 
         return out
 
@@ -254,20 +334,17 @@ class CashReport(object):
         current quarter.
         """
 
-        df = get_fund_balances()
+        df = self._get_data("Fund Balance")
         df = compare.end_of_quarter_balances(df, self.year, self.quarter)
         df = df.reset_index()
 
         # add No TRAN column
-        f = get_GF_balance_sheet()
+        f = self._get_data("Balance Sheet")
 
-        months = [7, 8, 9, 10, 11, 12, 1, 2, 3, 4, 5, 6]
-        actual_months = months[: 3 * self.quarter]
-        sel = f["month"].isin(actual_months)
-        sel &= (f["fiscal_year"] < self.year) & (f["quarter"] == 4) | (
-            (f["fiscal_year"] == self.year) & (f["quarter"] == self.quarter)
-        )
-        TRAN = f.loc[sel].groupby("fiscal_year")["TRAN"].sum().reset_index()
+        actual_months = compare.FISCAL_MONTHS[: 3 * self.quarter]
+        f = compare.latest_vintages(f, self.year, self.quarter, months=actual_months)
+        f = f.loc[f["fiscal_year"] <= self.year]
+        TRAN = f.groupby("fiscal_year")["TRAN"].sum().reset_index()
 
         df = pd.merge(df, TRAN, on=["fiscal_year"])
         df["General Fund (No TRAN)"] = df["General Fund"] - df["TRAN"]
@@ -294,17 +371,16 @@ class CashReport(object):
         Return the annual totals for General Fund revenues and spending.
         """
         out = []
-        dfs = [get_GF_revenues(), get_GF_spending()]
+        dfs = [self._get_data("Revenue"), self._get_data("Spending")]
         labels = ["Revenue", "Spending"]
         for i, label in enumerate(labels):
 
             df = dfs[i]
 
             # select valid
-            valid = (df["fiscal_year"] == self.year) & (df["quarter"] == self.quarter)
-            valid |= (df["fiscal_year"] != self.year) & (df["quarter"] == 4)
+            df = compare.latest_vintages(df, self.year, self.quarter)
 
-            X = df.loc[valid].groupby("fiscal_year").sum()
+            X = df.groupby("fiscal_year").sum()
             X = X.drop(labels=["month", "quarter"], axis=1)
             X = X.reset_index().melt(
                 id_vars=["fiscal_year"], value_name="Total", var_name="Name"
@@ -331,7 +407,7 @@ class CashReport(object):
         assert all(quarter in [1, 2, 3, 4] for quarter in quarters)
 
         out = []
-        dfs = [get_GF_revenues(), get_GF_spending()]
+        dfs = [self._get_data("Revenue"), self._get_data("Spending")]
         labels = ["Revenue", "Spending"]
         for i, label in enumerate(labels):
 
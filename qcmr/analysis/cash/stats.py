@@ -0,0 +1,69 @@
+import numpy as np
+
+__all__ = ["bootstrap_linear_fit", "percentile_interval"]
+
+
+def bootstrap_linear_fit(x, y, n_boot=10000, seed=42):
+    """
+    Bootstrap the intercept and slope of an ordinary least squares fit of
+    ``y`` on ``x``.
+
+    All resamples are drawn at once, using the same random draws as
+    a sequential bootstrap with :class:`numpy.random.RandomState` and the
+    input seed, and every fit is solved in closed form from batched sums.
+
+    Parameters
+    ----------
+    x : array_like
+        the independent variable
+    y : array_like
+        the dependent variable
+    n_boot : int, optional
+        the number of bootstrap resamples
+    seed : int, optional
+        the random seed
+
+    Returns
+    -------
+    ndarray :
+        the (intercept, slope) of each resample, with shape (2, n_boot)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+
+    # the resample indices, one row per bootstrap
+    rs = np.random.RandomState(seed)
+    resampler = rs.randint(0, n, (n_boot, n), dtype=np.intp)
+    xs = x[resampler]
+    ys = y[resampler]
+
+    # the batched sums
+    Sx = xs.sum(axis=1)
+    Sy = ys.sum(axis=1)
+    Sxx = (xs * xs).sum(axis=1)
+    Sxy = (xs * ys).sum(axis=1)
+
+    # solve the normal equations
+    det = n * Sxx - Sx ** 2
+    singular = det <= 1e-10 * n * Sxx
+    det[singular] = 1.0
+    slope = (n * Sxy - Sx * Sy) / det
+    intercept = (Sy - slope * Sx) / n
+
+    # resamples with a single x value have no unique solution; use the
+    # minimum-norm least squares solution for these
+    for i in np.flatnonzero(singular):
+        X = np.vstack([np.ones(n), xs[i]]).T
+        intercept[i], slope[i] = np.linalg.pinv(X).dot(ys[i])
+
+    return np.vstack([intercept, slope])
+
+
+def percentile_interval(a, which=95, axis=None):
+    """
+    Return the percentile interval of width ``which`` (in percent) of the
+    input data, ignoring NaNs.
+    """
+    p = 50 - which / 2, 50 + which / 2
+    return np.nanpercentile(a, p, axis)
@@ -1,39 +1,129 @@
-from .raw import load_cash_forecasts
+from .raw import load_cash_forecasts, get_cash_forecast_fingerprint
+import numpy as np
+import pandas as pd
 
 __all__ = [
     "get_GF_revenues",
     "get_GF_spending",
     "get_fund_balances",
     "get_GF_balance_sheet",
+    "clear_cache",
+    "to_panel",
+    "get_panel_key",
 ]
 
+# the columns identifying each row of the cash data
+PANEL_INDEX = ["fiscal_year", "quarter", "month"]
 
-def get_GF_revenues():
+# the name of the index of the cash data panels
+PANEL_KEY = "panel_key"
+
+# formatted data already loaded in this process, keyed by kind
+_cache = {}
+
+
+def get_GF_revenues(indexed=False):
     """
     Return the formatted General Fund cash revenues.
+
+    Parameters
+    ----------
+    indexed : bool, optional
+        whether to return the data on a sorted index of (fiscal_year,
+        quarter, month) keys; see :func:`to_panel`
     """
-    return _format_revenues(load_cash_forecasts("gf_revenue"))
+    return _load("gf_revenue", _format_revenues, indexed=indexed)
 
 
-def get_GF_spending():
+def get_GF_spending(indexed=False):
     """
     Return formatted General Fund cash spending.
+
+    Parameters
+    ----------
+    indexed : bool, optional
+        whether to return the data on a sorted index of (fiscal_year,
+        quarter, month) keys; see :func:`to_panel`
     """
-    return _format_spending(load_cash_forecasts("gf_spending"))
+    return _load("gf_spending", _format_spending, indexed=indexed)
 
 
-def get_fund_balances():
+def get_fund_balances(indexed=False):
     """
     Return historical fund balance cash levels.
+
+    Parameters
+    ----------
+    indexed : bool, optional
+        whether to return the data on a sorted index of (fiscal_year,
+        quarter, month) keys; see :func:`to_panel`
     """
-    return _format_fund_balances(load_cash_forecasts("fund_balances"))
+    return _load("fund_balances", _format_fund_balances, indexed=indexed)
 
 
-def get_GF_balance_sheet():
+def get_GF_balance_sheet(indexed=False):
     """
     Return historical General Fund balance sheet.
+
+    Parameters
+    ----------
+    indexed : bool, optional
+        whether to return the data on a sorted index of (fiscal_year,
+        quarter, month) keys; see :func:`to_panel`
     """
-    return _format_balance_sheet(load_cash_forecasts("gf_balance_sheet"))
+    return _load("gf_balance_sheet", _format_balance_sheet, indexed=indexed)
+
+
+def to_panel(df):
+    """
+    Return the input cash data on a sorted, unique index of
+    (fiscal_year, quarter, month) keys, encoded as integers.
+
+    The keys are computed once, so selections from the panel are binary
+    searches of its index; see :func:`get_panel_key`. The fiscal_year,
+    quarter, and month columns are kept, so selections from the panel have
+    the same layout as the input data.
+    """
+    key = get_panel_key(df["fiscal_year"], df["quarter"], df["month"])
+    panel = df.set_index(pd.Index(key, name=PANEL_KEY)).sort_index()
+    if not panel.index.is_unique:
+        raise ValueError("Cash data has duplicate (fiscal_year, quarter, month) rows")
+    return panel
+
+
+def get_panel_key(fiscal_year, quarter, month):
+    """
+    Encode (fiscal_year, quarter, month) as integers that sort in the
+    same order, e.g., 2020, 2, 7 is 2020207.
+
+    The inputs can be integers or arrays of them.
+    """
+    fiscal_year, quarter, month = map(np.asarray, [fiscal_year, quarter, month])
+    return (fiscal_year * 10 + quarter) * 100 + month
+
+
+def clear_cache():
+    """
+    Clear the cash data cached in this process.
+    """
+    _cache.clear()
+
+
+def _load(kind, formatter, indexed=False):
+    """
+    Internal function to load and format the data for a kind.
+
+    The formatted data, and its panel (see :func:`to_panel`), are cached
+    in this process and reused until the quarterly processed files change
+    on disk (see :func:`qcmr.raw.get_cash_forecast_fingerprint`). A copy is
+    returned, so callers can modify it freely.
+    """
+    fingerprint = get_cash_forecast_fingerprint(kind)
+    if _cache.get(kind, (None,))[0] != fingerprint:
+        df = formatter(load_cash_forecasts(kind))
+        _cache[kind] = (fingerprint, df, to_panel(df))
+
+    return _cache[kind][2 if indexed else 1].copy()
 
 
 def _format_spending(df):
@@ -0,0 +1,156 @@
+"""
+The ``qcmr`` command-line interface.
+"""
+from .parse import utils
+from .parse.core import QCMR
+from .parse.batch import get_available_reports, process_reports
+import argparse
+import time
+
+
+def parse_range(value, choices):
+    """
+    Parse a command-line range of integers, e.g., "2015-2020", "1,3",
+    or "all".
+
+    Parameters
+    ----------
+    value : str
+        the range to parse
+    choices : list of int
+        the valid values, in order; "all" selects all of them
+
+    Returns
+    -------
+    list of int :
+        the selected values
+    """
+    if value == "all":
+        return list(choices)
+
+    out = []
+    for part in value.split(","):
+        try:
+            if "-" in part:
+                start, stop = part.split("-")
+                out += range(int(start), int(stop) + 1)
+            else:
+                out.append(int(part))
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"invalid range '{value}'; use, e.g., 2015-2020, 1,3, or all"
+            )
+
+    invalid = sorted(set(out) - set(choices))
+    if len(invalid):
+        raise argparse.ArgumentTypeError(
+            f"invalid values {invalid}; valid values are {list(choices)}"
+        )
+    return sorted(set(out))
+
+
+def process(ns):
+    """
+    Process QCMR reports in parallel, skipping tables that are up to date.
+    """
+    reports = get_available_reports()
+    years = parse_range(ns.years, sorted(set(year for (year, _) in reports)))
+    quarters = parse_range(ns.quarters, [1, 2, 3, 4])
+
+    def report_progress(r):
+        report_progress.done += 1
+        tag = f"FY{utils.get_FY_abbreviation(r.year)}_Q{r.quarter}"
+        if r.skipped:
+            status = "up to date"
+        elif r.error is None:
+            status = f"{r.elapsed:.1f}s"
+        else:
+            status = f"FAILED ({r.error})"
+        print(f"[{report_progress.done}] {tag} {r.table}: {status}", flush=True)
+
+    report_progress.done = 0
+
+    start = time.perf_counter()
+    results = process_reports(
+        years=years,
+        quarters=quarters,
+        tables=ns.tables,
+        fresh=ns.fresh,
+        max_workers=ns.jobs,
+        missing=ns.missing,
+        progress=report_progress,
+        profile=ns.profile,
+        trace_memory=ns.trace_memory,
+    )
+    elapsed = time.perf_counter() - start
+
+    # the timing summary
+    ran = [r for r in results if not r.skipped]
+    failed = [r for r in ran if r.error is not None]
+    if len(ran):
+        print("\nJob timing:")
+        for r in sorted(ran, key=lambda r: r.elapsed, reverse=True):
+            tag = f"FY{utils.get_FY_abbreviation(r.year)}_Q{r.quarter}"
+            status = "ok" if r.error is None else "FAILED"
+            print(f"  {tag} {r.table:<25} {r.elapsed:8.1f}s  {status}")
+
+    print(
+        f"\n{len(ran)} processed ({len(failed)} failed), "
+        f"{len(results) - len(ran)} up to date, in {elapsed:.1f}s"
+    )
+    return 1 if len(failed) else 0
+
+
+def main(args=None):
+    """
+    Tools for the City of Philadelphia's Quarterly City Manager's Report.
+    """
+    parser = argparse.ArgumentParser(prog="qcmr", description=main.__doc__.strip())
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("process", help=process.__doc__.strip())
+    p.add_argument(
+        "--years",
+        default="all",
+        help="the fiscal years, e.g., 2015-2020 (default: all)",
+    )
+    p.add_argument(
+        "--quarters", default="all", help="the quarters, e.g., 1,2 (default: all)"
+    )
+    p.add_argument(
+        "--tables", nargs="*", choices=QCMR.tables, help="the tables (default: all)"
+    )
+    p.add_argument(
+        "--jobs", type=int, default=None, help="the number of worker processes"
+    )
+    p.add_argument(
+        "--fresh", action="store_true", help="re-parse tables that are up to date"
+    )
+    p.add_argument(
+        "--missing",
+        nargs="*",
+        default=["overrides", "totals", "raise"],
+        choices=["overrides", "totals", "nan", "raise"],
+        help="the strategies for filling missing values, tried in order",
+    )
+    p.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="append the timing of each parsing stage to this file, as JSON lines",
+    )
+    p.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also record the peak memory of each parsing stage in the profile",
+    )
+    p.set_defaults(func=process)
+
+    ns = parser.parse_args(args)
+    try:
+        return ns.func(ns)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,3 +2,4 @@
 # from .leave_usage import get_leave_usage
 
 from .core import QCMR
+from .batch import process_reports
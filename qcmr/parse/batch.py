@@ -0,0 +1,205 @@
+from .. import data_dir
+from . import utils
+from .core import QCMR
+from .instrument import Recorder
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import namedtuple
+from glob import glob
+import os
+import re
+import time
+
+__all__ = ["get_available_reports", "process_reports"]
+
+# a single unit of work: one table from one report
+Job = namedtuple("Job", ["year", "quarter", "table"])
+
+# the outcome of a job; error is None if the job succeeded, and skipped jobs
+# were already up to date
+JobResult = namedtuple(
+    "JobResult",
+    ["year", "quarter", "table", "elapsed", "error", "skipped"],
+    defaults=[False],
+)
+
+
+def get_available_reports():
+    """
+    Return the (fiscal year, quarter) of every raw QCMR PDF, in order.
+    """
+    out = []
+    for f in glob(os.path.join(data_dir, "raw", "FY*_Q*.pdf")):
+        matches = re.search("FY(?P<year>[0-9]{2})_Q(?P<quarter>[1234])", f)
+        year = int("20" + matches.group("year"))
+        quarter = int(matches.group("quarter"))
+        out.append((year, quarter))
+
+    return sorted(out)
+
+
+def _init_worker():
+    """
+    Initialize a worker process, paying the cost of importing the PDF
+    parsing backends once per worker rather than once per job.
+    """
+    import camelot  # noqa: F401
+
+
+def _index_report(year, quarter):
+    """
+    Internal function to build the page-text index for a report, returning
+    the error message if it fails, or None.
+    """
+    try:
+        utils.get_page_index(utils.get_raw_PDF_path(year, quarter))
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def _run_job(job, fresh, missing, profile=None, trace_memory=False):
+    """
+    Internal function to process a single table of a single report.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        recorder = None
+        if profile is not None:
+            recorder = Recorder(trace_memory=trace_memory, path=profile)
+        report = QCMR(job.year, job.quarter, missing=missing, recorder=recorder)
+        report.update_store = False  # updated by the parent process
+        report.update_manifest = False
+        getattr(report, job.table)(fresh=fresh)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    return JobResult(*job, elapsed=time.perf_counter() - start, error=error)
+
+
+def process_reports(
+    years=None,
+    quarters=None,
+    tables=None,
+    fresh=True,
+    max_workers=None,
+    missing=("overrides", "totals", "raise"),
+    progress=None,
+    profile=None,
+    trace_memory=False,
+):
+    """
+    Process tables from many QCMR reports in parallel.
+
+    Each (year, quarter, table) job runs in a pool of worker processes.
+    The page-text index of each report is built before any table is
+    parsed, so workers processing tables from the same report do not
+    repeat the text extraction. The consolidated cash forecast stores are
+    updated by the calling process once all jobs finish.
+
+    Parameters
+    ----------
+    years : list of int, optional
+        the fiscal years to process; default is all available years
+    quarters : list of int, optional
+        the quarters to process; default is all quarters
+    tables : list of str, optional
+        the tables to process; default is all tables in :attr:`QCMR.tables`
+    fresh : bool, optional
+        whether to re-parse all tables; if False, tables that are up to date
+        (see :func:`QCMR.is_up_to_date`) are skipped
+    max_workers : int, optional
+        the number of worker processes; default is the number of CPUs
+    missing : str, list of str, optional
+        the strategies for filling missing values; these should not include
+        'prompt', since workers cannot ask for input
+    progress : callable, optional
+        a function called with each :class:`JobResult` as the job finishes
+    profile : str, optional
+        if provided, append a record of each parsing stage of every job to
+        this file, as JSON lines; see :class:`qcmr.parse.instrument.Recorder`
+    trace_memory : bool, optional
+        whether to also record the peak memory of each stage in the profile;
+        this slows down parsing
+
+    Returns
+    -------
+    list of JobResult :
+        the result of each job, in the same order as the jobs
+    """
+    if tables is None:
+        tables = QCMR.tables
+    for table in tables:
+        if table not in QCMR.tables:
+            raise ValueError(f"{table} is not a valid table to be processed")
+
+    # the reports to process
+    reports = [
+        (year, quarter)
+        for (year, quarter) in get_available_reports()
+        if (years is None or year in years)
+        and (quarters is None or quarter in quarters)
+    ]
+
+    jobs = [
+        Job(year, quarter, table) for (year, quarter) in reports for table in tables
+    ]
+
+    # skip the tables that are up to date, and fail those that cannot be checked
+    results = {}
+    todo = []
+    for job in jobs:
+        error = None
+        try:
+            report = QCMR(job.year, job.quarter)
+            if not fresh:
+                report.adopt(job.table)
+            skipped = not fresh and report.is_up_to_date(job.table)
+        except Exception as e:
+            error, skipped = f"{type(e).__name__}: {e}", False
+
+        if error is None and not skipped:
+            todo.append(job)
+            continue
+
+        results[job] = JobResult(*job, elapsed=0.0, error=error, skipped=skipped)
+        if progress is not None:
+            progress(results[job])
+
+    if len(todo):
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker
+        ) as ex:
+
+            # index the reports first, failing the jobs of unreadable reports
+            reports = sorted(set((job.year, job.quarter) for job in todo))
+            errors = dict(zip(reports, ex.map(_index_report, *zip(*reports))))
+
+            # and then parse the tables
+            futures = []
+            for job in todo:
+                error = errors[(job.year, job.quarter)]
+                if error is None:
+                    futures.append(
+                        ex.submit(_run_job, job, True, missing, profile, trace_memory)
+                    )
+                else:
+                    results[job] = JobResult(*job, elapsed=0.0, error=error)
+                    if progress is not None:
+                        progress(results[job])
+            for future in as_completed(futures):
+                r = future.result()
+                results[Job(r.year, r.quarter, r.table)] = r
+                if progress is not None:
+                    progress(r)
+
+    # update the manifests and consolidated stores one quarter at a time
+    from ..raw import update_cash_forecast_store
+
+    for job in todo:
+        r = results[job]
+        if r.error is None:
+            QCMR(r.year, r.quarter).record_manifest(r.table)
+            if r.table == "cash_forecast":
+                update_cash_forecast_store(r.year, r.quarter)
+
+    return [results[job] for job in jobs]
@@ -1,7 +1,14 @@
-from . import utils, tables
+from . import utils
+from . import instrument
+from . import tables as tables_module
+from .session import ExtractionSession
+from .tables.table import Table
 from .. import data_dir
 import os
+import json
+import hashlib
 import pandas as pd
+from glob import glob
 
 
 class QCMR(object):
@@ -14,14 +21,49 @@ class QCMR(object):
         the fiscal year of the report
     quarter : int
         the fiscal quarter of the report
+    missing : str, list of str, optional
+        the strategy, or strategies, for filling missing values in parsed
+        tables; see :func:`qcmr.parse.utils.fill_missing_values`
+    recorder : Recorder, optional
+        if provided, record the time spent in each stage of parsing; see
+        :class:`qcmr.parse.instrument.Recorder`
     """
 
     tables = ["leave_usage", "cash_forecast", "general_fund_obligations"]
 
-    def __init__(self, year, quarter):
+    # the titles of each table, also used as the names of processed folders
+    titles = {
+        "leave_usage": "Leave Usage Analysis",
+        "cash_forecast": "Cash Flow Forecast",
+        "general_fund_obligations": "General Fund Obligations",
+    }
+
+    # whether to record parsed tables in the manifest of processed tables
+    update_manifest = True
+
+    # the file format for processed tables: 'csv', 'parquet', or 'feather'
+    file_format = "csv"
+
+    # whether to update the consolidated cash forecast stores when the
+    # cash forecast is parsed
+    update_store = True
+
+    # the phrases identifying the pages of each table
+    page_tags = {
+        "leave_usage": ["TOTAL LEAVE USAGE ANALYSIS"],
+        "cash_forecast": ["CASH FLOW PROJECTIONS"],
+        "general_fund_obligations": ["DEPARTMENTAL OBLIGATIONS SUMMARY"],
+    }
+
+    # the number of matching pages needed to parse each table
+    page_counts = {"leave_usage": 2, "cash_forecast": 2, "general_fund_obligations": 2}
+
+    def __init__(self, year, quarter, missing="prompt", recorder=None):
 
         self.year = year
         self.quarter = quarter
+        self.missing = missing
+        self.recorder = recorder
 
         # the path to the raw PDF
         self.pdf_path = utils.get_raw_PDF_path(year, quarter)
@@ -37,23 +79,41 @@ class QCMR(object):
         # verify processed path
         path = os.path.join(data_dir, "processed", self.tag)
         if not os.path.exists(path):
-            os.makedirs(path)
-
-        # determine the start pages for each tables
-        self._pages = utils.get_pages(
-            self.pdf_path,
-            {
-                "leave_usage": ["TOTAL LEAVE USAGE ANALYSIS"],
-                "cash_forecast": ["CASH FLOW PROJECTIONS"],
-                "general_fund_obligations": ["DEPARTMENTAL OBLIGATIONS SUMMARY"],
-            },
-        )
+            os.makedirs(path, exist_ok=True)
+
+        self.__pages = None
 
     def __repr__(self):
         return "<QCMR: %s>" % self.tag
 
+    @property
+    def _pages(self):
+        """
+        The page numbers for each table, determined on first access from
+        the report's page-text index.
+        """
+        if self.__pages is None:
+            with instrument.recording(self.recorder), instrument.scope(tag=self.tag):
+                with instrument.stage("page_detection") as record:
+                    self.__pages = utils.get_pages(
+                        self.pdf_path, self.page_tags, limits=self.page_counts
+                    )
+                    record["pages"] = sum(len(p) for p in self.__pages.values())
+        return self.__pages
+
     def process(self, tables=None, fresh=False):
+        """
+        Process the input tables, extracting the pages of all tables that
+        need parsing from the PDF together.
 
+        Parameters
+        ----------
+        tables : list of str, optional
+            the tables to process; default is all tables
+        fresh : bool, optional
+            whether to re-parse all tables; if False, only tables that are
+            not up to date (see :func:`is_up_to_date`) are re-parsed
+        """
         if tables is None:
             tables = self.tables
 
@@ -61,62 +121,195 @@ class QCMR(object):
             func = getattr(self, table, None)
             if func is None:
                 raise ValueError(f"{table} is not a valid table to be processed")
-            func(fresh=fresh)
 
-    def leave_usage(self, fresh=False):
+        with instrument.recording(self.recorder), instrument.scope(tag=self.tag):
+
+            # the tables whose inputs or parser changed
+            todo = []
+            for table in tables:
+                if not fresh:
+                    self.adopt(table)
+                if fresh or not self.is_up_to_date(table):
+                    todo.append(table)
+
+            # extract the pages needed by every table in one session
+            session = ExtractionSession(self.pdf_path)
+            requests = []
+            for table in todo:
+                module = getattr(tables_module, table)
+                requests += module.get_requests(self._pages[table], self.pdf_path)
+            session.prefetch(requests)
+
+            for table in tables:
+                getattr(self, table)(fresh=table in todo, session=session)
+
+    @property
+    def manifest_path(self):
         """
-        The total leave usage by department.
+        The path to the manifest of processed tables for this report.
         """
-        title = "Leave Usage Analysis"
-        path = os.path.join(data_dir, "processed", self.tag, title)
+        return os.path.join(data_dir, "processed", self.tag, "manifest.json")
 
-        if fresh or not os.path.exists(path):
-            table = tables.leave_usage.parse(
-                title, self.pdf_path, self._pages["leave_usage"]
-            )
-            table.to_file(path)
-        else:
-            from .tables.table import Table
+    def is_up_to_date(self, table):
+        """
+        Whether the processed files for a table exist and were parsed from
+        the same inputs by the current parser.
 
-            table = Table.read_file(path)
+        The inputs are recorded in the manifest of processed tables; a
+        table is up to date if the PDF is unchanged, or if the text of the
+        table's pages is unchanged. Processed tables without a manifest
+        entry are not up to date until they are adopted; see :func:`adopt`.
 
-        return table
+        Parameters
+        ----------
+        table : str
+            the name of the table
+        """
+        if not self._has_processed_files(table):
+            return False
+
+        entry = self._read_manifest().get(table)
+        if entry is None:
+            return False
 
-    def cash_forecast(self, fresh=False):
+        module = getattr(tables_module, table)
+        if entry["parser_version"] != module.PARSER_VERSION:
+            return False
+        if entry["pdf_hash"] == utils.open_document(self.pdf_path).hash:
+            return True
+        return entry["pages_hash"] == self._get_pages_hash(table)
+
+    def adopt(self, table):
         """
-        The cash flow forecast
+        Record the inputs of a table that was processed before manifests
+        existed, so that it is treated as up to date from now on.
+
+        This is a one-time migration; it does nothing if the table has a
+        manifest entry or has not been processed.
+
+        Parameters
+        ----------
+        table : str
+            the name of the table
         """
-        title = "Cash Flow Forecast"
-        path = os.path.join(data_dir, "processed", self.tag, title)
+        if not self.update_manifest or not self._has_processed_files(table):
+            return
+        if table not in self._read_manifest():
+            self.record_manifest(table)
 
-        if fresh or not os.path.exists(path):
-            table = tables.cash_forecast.parse(
-                title, self.pdf_path, self._pages["cash_forecast"]
-            )
-            table.to_file(path)
-        else:
-            from .tables.table import Table
+    def record_manifest(self, table):
+        """
+        Record the inputs of a processed table in the manifest.
+
+        Parameters
+        ----------
+        table : str
+            the name of the table
+        """
+        module = getattr(tables_module, table)
 
-            table = Table.read_file(path)
+        manifest = self._read_manifest()
+        manifest[table] = {
+            "pdf_hash": utils.open_document(self.pdf_path).hash,
+            "pages": list(self._pages[table]),
+            "pages_hash": self._get_pages_hash(table),
+            "parser_version": module.PARSER_VERSION,
+        }
 
-        return table
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
 
-    def general_fund_obligations(self, fresh=False):
+    def _read_manifest(self):
+        """
+        Internal function to read the manifest, keyed by table.
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def _get_pages_hash(self, table):
+        """
+        Internal function to return a hash of the text of a table's pages.
+        """
+        doc = utils.open_document(self.pdf_path)
+
+        sha = hashlib.sha256()
+        for page in self._pages[table]:
+            sha.update(doc.get_text(page).encode("utf-8"))
+        return sha.hexdigest()
+
+    def leave_usage(self, fresh=False, session=None):
+        """
+        The total leave usage by department.
+        """
+        return self._get_table("leave_usage", fresh=fresh, session=session)
+
+    def cash_forecast(self, fresh=False, session=None):
+        """
+        The cash flow forecast
+        """
+        return self._get_table(
+            "cash_forecast", fresh=fresh, session=session, missing=self.missing
+        )
+
+    def general_fund_obligations(self, fresh=False, session=None):
         """
         General Fund obligations by department.
         """
-        title = "General Fund Obligations"
-        path = os.path.join(data_dir, "processed", self.tag, title)
+        return self._get_table(
+            "general_fund_obligations", fresh=fresh, session=session
+        )
+
+    def _get_path(self, table):
+        """
+        Internal function to return the path of a processed table.
+        """
+        return os.path.join(data_dir, "processed", self.tag, self.titles[table])
 
-        if fresh or not os.path.exists(path):
-            table = tables.general_fund_obligations.parse(
-                title, self.pdf_path, self._pages["general_fund_obligations"]
-            )
-            table.to_file(path)
-        else:
-            from .tables.table import Table
+    def _has_processed_files(self, table):
+        """
+        Internal function to test whether a table has processed files.
+        """
+        return len(glob(os.path.join(self._get_path(table), "*"))) > 0
+
+    def _get_table(self, table, fresh=False, session=None, **kwargs):
+        """
+        Internal function to parse a table from the PDF, or load it from
+        its processed files if it has already been parsed.
+
+        Existing processed files are read without touching the PDF; use
+        :func:`process` to re-parse only the tables that are out of date.
+        Any keywords are passed to the parse function of the table.
+        """
+        title = self.titles[table]
+        path = self._get_path(table)
+
+        if fresh or not self._has_processed_files(table):
+            module = getattr(tables_module, table)
+            pages = self._pages[table]
 
-            table = Table.read_file(path)
+            with instrument.recording(self.recorder):
+                with instrument.scope(tag=self.tag, table=table):
+                    with instrument.stage("parse", pages=len(pages)) as record:
+                        out = module.parse(
+                            title, self.pdf_path, pages, session=session, **kwargs
+                        )
+                        record["rows"] = sum(len(out[key]) for key in out.keys)
 
-        return table
+                    with instrument.stage("to_file", rows=record["rows"]):
+                        out.to_file(path, format=self.file_format)
+
+            if self.update_manifest:
+                self.record_manifest(table)
+
+            if table == "cash_forecast" and self.update_store:
+                from ..raw import update_cash_forecast_store
+
+                update_cash_forecast_store(self.year, self.quarter, out)
+        else:
+            out = Table.read_file(path)
 
+        return out
@@ -0,0 +1,179 @@
+from contextlib import contextmanager
+import json
+import time
+import tracemalloc
+
+__all__ = ["Recorder", "recording", "scope", "stage"]
+
+# the recorders that are currently active, innermost last
+_active = []
+
+
+class Recorder(object):
+    """
+    Record the wall time, CPU time, and peak memory of each stage of
+    parsing a QCMR, along with the number of pages and rows processed.
+
+    Use the recorder as a context manager to record the stages run inside
+    it, or pass it to :class:`qcmr.parse.QCMR`. Each record is a dict with
+    keys "tag", "table", "stage", "start", "wall_time", "cpu_time", "pages",
+    "rows", and "peak_memory" (in bytes, or None if memory is not traced).
+
+    Parameters
+    ----------
+    trace_memory : bool, optional
+        whether to trace the peak memory of each stage with
+        :mod:`tracemalloc`; off by default, since it slows down parsing,
+        in which case "peak_memory" is None
+    path : str, optional
+        if provided, append each record to this file as a line of JSON
+    """
+
+    def __init__(self, trace_memory=False, path=None):
+
+        self.trace_memory = trace_memory
+        self.path = path
+        self.records = []
+
+        # the context fields (e.g., tag and table) set by scope()
+        self._context = [{}]
+
+        # the stages that are running, innermost last
+        self._stages = []
+        self._started_tracing = False
+
+    def __repr__(self):
+        return "<Recorder: %d records>" % len(self.records)
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active.remove(self)
+        if self._started_tracing and self not in _active:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def scope(self, **fields):
+        """
+        Add the input fields (e.g., tag or table) to every record made
+        inside this context.
+        """
+        self._context.append(dict(self._context[-1], **fields))
+        try:
+            yield
+        finally:
+            self._context.pop()
+
+    @contextmanager
+    def stage(self, name, pages=None, rows=None):
+        """
+        Record a stage; the yielded record can be updated with the number
+        of pages and rows processed before the stage ends.
+        """
+        record = {"tag": None, "table": None}
+        record.update(self._context[-1])
+        record.update(stage=name, start=time.time(), pages=pages, rows=rows)
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            self._update_peak()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+
+        self._stages.append([0])
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.perf_counter() - wall
+            record["cpu_time"] = time.process_time() - cpu
+
+            peak = self._stages.pop()[0]
+            record["peak_memory"] = None
+            if tracing:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                record["peak_memory"] = max(peak - base, 0)
+                if len(self._stages):
+                    self._stages[-1][0] = max(self._stages[-1][0], peak)
+
+            self._add(record)
+
+    def to_json_lines(self, path):
+        """
+        Write the records to a file, one JSON object per line.
+        """
+        with open(path, "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+    def to_frame(self):
+        """
+        Return the records as a pandas DataFrame.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.records)
+
+    def _update_peak(self):
+        """
+        Internal function to save the peak memory of the running stage
+        before a nested stage resets it.
+        """
+        if len(self._stages):
+            peak = tracemalloc.get_traced_memory()[1]
+            self._stages[-1][0] = max(self._stages[-1][0], peak)
+
+    def _add(self, record):
+        """
+        Internal function to store a finished record.
+        """
+        self.records.append(record)
+        if self.path is not None:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def recording(recorder):
+    """
+    Activate the input recorder, if it is not None and not already active.
+    """
+    if recorder is None or recorder in _active:
+        yield recorder
+    else:
+        with recorder:
+            yield recorder
+
+
+@contextmanager
+def scope(**fields):
+    """
+    Add the input fields to the records of the active recorder, if any.
+    """
+    if not len(_active):
+        yield
+    else:
+        with _active[-1].scope(**fields):
+            yield
+
+
+@contextmanager
+def stage(name, pages=None, rows=None):
+    """
+    Record a stage with the active recorder, if any.
+
+    The yielded record (a dict) can be updated with the number of "pages"
+    and "rows" processed; if no recorder is active, it is discarded.
+    """
+    if not len(_active):
+        yield {}
+    else:
+        with _active[-1].stage(name, pages=pages, rows=rows) as record:
+            yield record
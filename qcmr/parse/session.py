@@ -0,0 +1,201 @@
+from . import utils
+from . import instrument
+import pandas as pd
+import os
+import json
+import hashlib
+
+__all__ = ["ExtractionSession", "CachedTable"]
+
+
+class ExtractionSession(object):
+    """
+    Extract tables from a single PDF with camelot, sharing the work
+    between the parsers of different tables.
+
+    Pages requested up front with :func:`prefetch` are extracted together,
+    with one camelot pass per distinct set of read options, and later reads
+    of those pages are served from memory.
+
+    The raw tables from each page are also cached on disk, keyed by the
+    content of the PDF, the page, the read options, and the camelot
+    version, so re-parsing a report does not need camelot at all.
+
+    Parameters
+    ----------
+    pdf_path : str
+        the path to the PDF to read
+    cache : bool, optional
+        whether to read and write the on-disk cache of raw tables
+    """
+
+    def __init__(self, pdf_path, cache=True):
+
+        self.pdf_path = pdf_path
+        self.cache = cache
+
+        # camelot tables, keyed by (page, read options)
+        self._tables = {}
+
+    def __repr__(self):
+        return "<ExtractionSession: %s>" % self.pdf_path
+
+    def prefetch(self, requests):
+        """
+        Extract the requested pages, combining requests that share the
+        same read options into a single pass.
+
+        Parameters
+        ----------
+        requests : list of (list of int, dict)
+            the (one-indexed) pages to read and the keywords to pass to
+            :func:`camelot.read_pdf` for them
+        """
+        groups = {}
+        for pages, kwargs in requests:
+            key = _get_key(kwargs)
+            _, todo = groups.setdefault(key, (kwargs, set()))
+            todo.update(page for page in pages if (page, key) not in self._tables)
+
+        for key, (kwargs, pages) in groups.items():
+            if len(pages):
+                self._extract(sorted(pages), kwargs)
+
+    def read(self, pages, **kwargs):
+        """
+        Return the tables on the input pages, extracting any pages that
+        have not already been read with the same options.
+
+        Parameters
+        ----------
+        pages : list of int
+            the (one-indexed) pages to read
+        **kwargs :
+            keywords passed to :func:`camelot.read_pdf`
+
+        Returns
+        -------
+        list :
+            the camelot tables, ordered by page
+        """
+        key = _get_key(kwargs)
+        missing = [page for page in pages if (page, key) not in self._tables]
+        if len(missing):
+            self._extract(missing, kwargs)
+
+        return sum([self._tables[(page, key)] for page in pages], [])
+
+    def _extract(self, pages, kwargs):
+        """
+        Internal function to run camelot over a set of pages, using the
+        on-disk cache for any pages that have already been read.
+        """
+        key = _get_key(kwargs)
+
+        if self.cache:
+            cached = {}
+            with instrument.stage("camelot_cache") as record:
+                for page in pages:
+                    path = self._get_cache_path(page, key)
+                    if os.path.exists(path):
+                        cached[page] = [
+                            CachedTable.from_dict(d) for d in utils.read_json(path)
+                        ]
+                record["pages"] = len(cached)
+                record["rows"] = sum(len(t.df) for v in cached.values() for t in v)
+
+            self._tables.update({(page, key): cached[page] for page in cached})
+            pages = [page for page in pages if page not in cached]
+            if not len(pages):
+                return
+
+        import camelot
+
+        with instrument.stage("camelot_read", pages=len(pages)) as record:
+            tables = camelot.read_pdf(
+                self.pdf_path, pages=",".join(map(str, pages)), **kwargs
+            )
+            record["rows"] = sum(len(table.df) for table in tables)
+
+        for page in pages:
+            self._tables[(page, key)] = []
+        for table in tables:
+            self._tables[(int(table.page), key)].append(table)
+
+        if self.cache:
+            for page in pages:
+                utils.write_json(
+                    [CachedTable.to_dict(t) for t in self._tables[(page, key)]],
+                    self._get_cache_path(page, key),
+                )
+
+    def _get_cache_path(self, page, key):
+        """
+        Internal function to return the path of the cached raw tables for
+        a page read with the input options.
+        """
+        from importlib.metadata import version
+
+        pdf_hash = utils.open_document(self.pdf_path).hash
+        name = f"{pdf_hash}:{page}:{key}:{version('camelot-py')}"
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+        return os.path.join(utils.cache_dir, "camelot", f"{digest}.json.gz")
+
+
+class CachedTable(object):
+    """
+    A table read from the on-disk cache, with the attributes of a camelot
+    table that the parsers use.
+
+    Parameters
+    ----------
+    df : DataFrame
+        the raw table, as strings
+    page : int
+        the (one-indexed) page of the table
+    bbox : tuple, optional
+        the bounding box of the table on the page
+    cols : list of tuple, optional
+        the (left, right) edges of each column
+    """
+
+    def __init__(self, df, page, bbox=None, cols=None):
+
+        self.df = df
+        self.page = page
+        self._bbox = bbox
+        self.cols = cols
+
+    def __repr__(self):
+        return "<CachedTable shape=%s page=%s>" % (self.df.shape, self.page)
+
+    @staticmethod
+    def to_dict(table):
+        """
+        Return the cached attributes of a camelot (or cached) table.
+        """
+        return {
+            "page": int(table.page),
+            "data": table.df.values.tolist(),
+            "bbox": list(table._bbox),
+            "cols": [list(col) for col in table.cols],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Create a cached table from the output of :func:`to_dict`.
+        """
+        return cls(
+            pd.DataFrame(d["data"]),
+            d["page"],
+            bbox=tuple(d["bbox"]),
+            cols=[tuple(col) for col in d["cols"]],
+        )
+
+
+def _get_key(kwargs):
+    """
+    Internal function to return a hashable key for a set of read options.
+    """
+    return json.dumps(kwargs, sort_keys=True)
@@ -1,13 +1,55 @@
 from .. import utils
+from .. import instrument
+from ..session import ExtractionSession
 from .table import Table
-import camelot
 import pandas as pd
+import os
+import re
 import warnings
 
-__all__ = ["parse"]
+__all__ = ["get_requests", "parse"]
 
+# the version of the parser; increment it when a change alters the parsed
+# output, so that processed tables are re-parsed
+PARSER_VERSION = 1
 
-def parse(title, pdf_path, pages):
+# where layout hints learned from parsed reports are stored, one file per
+# vintage and page, so parallel parses never overwrite each other's hints
+LAYOUT_HINTS_DIR = os.path.join(utils.cache_dir, "layouts", "cash_forecast")
+
+# the options for reading a full page with camelot
+FULL_PAGE_OPTIONS = {"flavor": "stream", "edge_tol": 500}
+
+
+def get_requests(pages, pdf_path=None):
+    """
+    Return the pages to read for the Cash Flow Forecast table, and the
+    options to pass to camelot when reading them.
+
+    Parameters
+    ----------
+    pages : list of int
+        the list of page numbers for the table in the report
+    pdf_path : str, optional
+        the path to the PDF, used to look up layout hints for the report
+
+    Returns
+    -------
+    list of (list of int, dict) :
+        the (one-indexed) pages to read and the camelot read options
+    """
+    if len(pages) != 2:
+        return []
+
+    vintage = None if pdf_path is None else _get_vintage(pdf_path)
+    out = []
+    for page, kind in zip(pages, ["cash", "fund_balances"]):
+        out.append(([page + 1], _get_read_options(vintage, kind)))
+
+    return out
+
+
+def parse(title, pdf_path, pages, session=None, missing="prompt"):
     """
     Parse the Cash Flow Forecast table in the QCMR.
 
@@ -19,6 +61,12 @@ def parse(title, pdf_path, pages):
         the path to the PDF to read
     pages : list of int
         the list of page numbers for the table in the report
+    session : ExtractionSession, optional
+        the session to read the PDF with; if not provided, a new session
+        is created
+    missing : str, list of str, optional
+        the strategy, or strategies, for filling missing values; see
+        :func:`qcmr.parse.utils.fill_missing_values`
 
     Returns
     -------
@@ -26,31 +74,220 @@ def parse(title, pdf_path, pages):
         the table object holding the parsed DataFrames
     """
     # get pages of cash forecast data
-    assert len(pages) == 2
-    pages = ",".join(map(str, [pages[0] + 1, pages[1] + 1]))  # cash report is two pages
+    assert len(pages) == 2  # cash report is two pages
+    report = os.path.splitext(os.path.basename(pdf_path))[0]
 
     # read the PDF
-    tables = camelot.read_pdf(pdf_path, pages=pages, flavor="stream", edge_tol=500)
+    if session is None:
+        session = ExtractionSession(pdf_path)
+    dfs = [
+        _read_page(session, pages[0] + 1, "cash").df.copy(),
+        _read_page(session, pages[1] + 1, "fund_balances").df.copy(),
+    ]
 
     # sanitize
-    for table in tables:
-        table.df[0] = table.df[0].apply(utils.sanitize_strings)
+    for df in dfs:
+        df[0] = df[0].apply(utils.sanitize_strings)
 
-    # do revenue, spending and balance sheet
+    # do revenue, spending and balance sheet, and then fund balances
     data = {}
-    tags = ["gf_revenue", "gf_spending", "gf_balance_sheet"]
-    formatters = [_format_revenue, _format_spending, _format_balance_sheet]
-    for tag, formatter in zip(tags, formatters):
-        data[tag] = utils.fill_missing_values(formatter(tables[0].df))
-
-    # get fund balances
-    data["fund_balances"] = utils.fill_missing_values(
-        _format_fund_balances(tables[1].df)
-    )
+    tags = ["gf_revenue", "gf_spending", "gf_balance_sheet", "fund_balances"]
+    formatters = [
+        _format_revenue,
+        _format_spending,
+        _format_balance_sheet,
+        _format_fund_balances,
+    ]
+    for tag, formatter, df in zip(tags, formatters, [dfs[0]] * 3 + [dfs[1]]):
+        with instrument.stage("format") as record:
+            data[tag] = formatter(df)
+            record["rows"] = len(data[tag])
+
+        with instrument.stage("fill_missing_values") as record:
+            data[tag] = utils.fill_missing_values(
+                data[tag],
+                how=missing,
+                tag=report,
+                table=tag,
+                totals=totals[tag],
+            )
+            record["rows"] = len(data[tag])
 
     return Table(title, **data)
 
 
+def _read_page(session, page, kind):
+    """
+    Internal function to read a single page of the cash flow forecast.
+
+    If a layout hint is available for the report's vintage, camelot only
+    parses the hinted table area, with fixed column separators. If there
+    is no hint, or the hinted table fails validation, the full page is
+    parsed and its layout is saved as the hint for this vintage.
+
+    Parameters
+    ----------
+    session : ExtractionSession
+        the session to read the PDF with
+    page : int
+        the (one-indexed) page number to read
+    kind : 'cash', 'fund_balances'
+        the table on the page
+    """
+    vintage = _get_vintage(session.pdf_path)
+
+    # try the hinted table area first
+    options = _get_read_options(vintage, kind)
+    if options != FULL_PAGE_OPTIONS:
+        tables = session.read([page], **options)
+        if len(tables) and _is_valid(tables[0].df, kind):
+            return tables[0]
+
+    # fall back to the full page
+    table = session.read([page], **FULL_PAGE_OPTIONS)[0]
+
+    # learn the layout for next time
+    if vintage is not None and _is_valid(table.df, kind):
+        _save_layout_hint(vintage, kind, table)
+
+    return table
+
+
+def _get_read_options(vintage, kind):
+    """
+    Internal function to return the camelot options for reading a table,
+    using the layout hint for the vintage if there is one.
+    """
+    hint = _get_layout_hint(vintage, kind)
+    if hint is None:
+        return FULL_PAGE_OPTIONS
+
+    return {
+        "flavor": "stream",
+        "table_areas": [hint["table_area"]],
+        "columns": [hint["columns"]],
+    }
+
+
+def _get_vintage(pdf_path):
+    """
+    Internal function to return the vintage (fiscal year tag) of a report,
+    e.g., 'FY20', or None if it cannot be determined from the file name.
+    """
+    matches = re.search("FY(?P<year>[0-9]{2})_Q[1234]", os.path.basename(pdf_path))
+    if matches is None:
+        return None
+    return "FY" + matches.group("year")
+
+
+def _get_layout_hint(vintage, kind):
+    """
+    Internal function to return the layout hint for a table, using the
+    hint for this vintage, or else the most recent earlier vintage.
+    """
+    if vintage is None or not os.path.isdir(LAYOUT_HINTS_DIR):
+        return None
+
+    suffix = f"_{kind}.json.gz"
+    candidates = sorted(
+        f[: -len(suffix)]
+        for f in os.listdir(LAYOUT_HINTS_DIR)
+        if f.endswith(suffix) and f[: -len(suffix)] <= vintage
+    )
+    if not len(candidates):
+        return None
+    return utils.read_json(_get_layout_hint_path(candidates[-1], kind))
+
+
+def _save_layout_hint(vintage, kind, table, pad=5.0):
+    """
+    Internal function to save the table area and column separators of a
+    parsed camelot table as the layout hint for a vintage.
+    """
+    x1, y1, x2, y2 = table._bbox
+    area = [x1 - pad, y2 + pad, x2 + pad, y1 - pad]  # left, top, right, bottom
+    separators = [col[1] for col in table.cols[:-1]]
+
+    hint = {
+        "table_area": ",".join(f"{x:.2f}" for x in area),
+        "columns": ",".join(f"{x:.2f}" for x in separators),
+    }
+    utils.write_json(hint, _get_layout_hint_path(vintage, kind))
+
+
+def _get_layout_hint_path(vintage, kind):
+    """
+    Internal function to return the path of the layout hint for a vintage.
+    """
+    return os.path.join(LAYOUT_HINTS_DIR, f"{vintage}_{kind}.json.gz")
+
+
+def _is_valid(df, kind):
+    """
+    Internal function to test whether a raw camelot table holds the
+    expected data.
+
+    The table must format without errors, include the expected totals,
+    and each total must match the sum of its components.
+    """
+    df = df.copy()
+    df[0] = df[0].apply(utils.sanitize_strings)
+
+    if kind == "cash":
+        tags = ["gf_revenue", "gf_spending", "gf_balance_sheet"]
+        formatters = [_format_revenue, _format_spending, _format_balance_sheet]
+    else:
+        tags = ["fund_balances"]
+        formatters = [_format_fund_balances]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for tag, formatter in zip(tags, formatters):
+            try:
+                out = formatter(df)
+            except Exception:
+                return False
+
+            if not set(totals[tag]) <= set(out["category"]):
+                return False
+            if len(_check_totals(out, totals[tag])):
+                return False
+
+    return True
+
+
+def _check_totals(df, totals, atol=1.0):
+    """
+    Internal function to check the totals in a formatted table against
+    the sum of their components.
+
+    Parameters
+    ----------
+    df : DataFrame
+        the formatted table, with a "category" column and a column per month
+    totals : dict
+        mapping from the name of each total to the names of its components;
+        components missing from the table are ignored
+    atol : float, optional
+        the absolute tolerance allowed for rounding
+
+    Returns
+    -------
+    list of tuple :
+        the (total, month) pairs where the total does not match
+    """
+    X = df.set_index("category")
+    out = []
+    for total, components in totals.items():
+        if total not in X.index:
+            continue
+        components = [c for c in components if c in X.index]
+        diff = (X.loc[components].sum() - X.loc[total]).abs()
+        out += [(total, month) for month in diff.index[diff > atol]]
+
+    return out
+
+
 def _update_categories(df, names, col_num=0):
     """
     Internal function to update spending/revenue categories
@@ -243,3 +480,65 @@ categories["fund_balances"] = {
     "TOTAL CAPITAL FUNDS": "total_capital_funds",
     "TOTAL FUND EQUITY": "total_fund_equity",
 }
+
+# each total is the sum of its components
+totals = {}
+totals["gf_revenue"] = {
+    "total_current_revenue": [
+        "real_estate_tax",
+        "wage_earnings_net_profits",
+        "realty_transfer_tax",
+        "sales_tax",
+        "birt",
+        "beverage_tax",
+        "other_taxes",
+        "locally_generated_non_tax",
+        "total_other_govts",
+        "total_pica_other_govts",
+        "interfund_transfers",
+    ],
+    "total_cash_receipts": [
+        "total_current_revenue",
+        "prior_year_revenue",
+        "adjustments",
+    ],
+}
+
+totals["gf_spending"] = {
+    "current_year_appropriation": [
+        "payroll",
+        "employee_benefits",
+        "pension",
+        "purchases_of_services",
+        "materials_equipment",
+        "contributions_indemnities",
+        "debt_service_short",
+        "debt_service_long",
+        "interfund_charges",
+        "advances_misc_payments",
+    ],
+    "total_disbursements": [
+        "current_year_appropriation",
+        "prior_year_expenditures_against_encumbrances",
+        "prior_year_salaries_vouchers_payable",
+    ],
+}
+
+totals["gf_balance_sheet"] = {
+    "closing_balance": ["opening_balance", "receipts_minus_disbursements", "tran"]
+}
+
+totals["fund_balances"] = {
+    "total_operating_funds": [
+        "general_fund",
+        "grants_revenue",
+        "community_development",
+        "vehicle_rental_tax",
+        "hospital_assessment_fund",
+        "housing_trust_fund",
+        "budget_stabilization_fund",
+        "other_funds",
+    ],
+    "total_capital_funds": ["capital_improvement", "industrial_commercial_dev"],
+    "total_fund_equity": ["total_operating_funds", "total_capital_funds"],
+}
@@ -1,13 +1,39 @@
 from .table import Table
 from .. import utils
-import camelot
+from .. import instrument
+from ..session import ExtractionSession
 import pandas as pd
 import numpy as np
 
-__all__ = ["parse"]
+__all__ = ["get_requests", "parse"]
 
+# the parser version; increment to re-parse processed tables
+PARSER_VERSION = 1
 
-def parse(title, pdf_path, pages):
+
+def get_requests(pages, pdf_path=None):
+    """
+    Return the pages to read for the General Fund Departmental Obligations
+    table, and the options to pass to camelot when reading them.
+
+    Parameters
+    ----------
+    pages : list of int
+        the list of page numbers for the table in the report
+    pdf_path : str, optional
+        the path to the PDF; not needed for this table
+
+    Returns
+    -------
+    list of (list of int, dict) :
+        the (one-indexed) pages to read and the camelot read options
+    """
+    if len(pages) != 2:
+        return []
+    return [([page + 1 for page in pages], {"flavor": "stream"})]
+
+
+def parse(title, pdf_path, pages, session=None):
     """
     Parse the General Fund Departmental Obligations table in the QCMR.
 
@@ -23,6 +49,9 @@ def parse(title, pdf_path, pages):
         the path to the PDF to read
     pages : list of int
         the list of page numbers for the table in the report
+    session : ExtractionSession, optional
+        the session to read the PDF with; if not provided, a new session
+        is created
 
     Returns
     -------
@@ -31,12 +60,18 @@ def parse(title, pdf_path, pages):
     """
     # get pages of cash forecast data
     assert len(pages) == 2
-    pages = ",".join([str(page + 1) for page in pages])
+    [(read_pages, kwargs)] = get_requests(pages)
 
     # read the PDF
-    tables = camelot.read_pdf(pdf_path, pages=pages, flavor="stream")
+    if session is None:
+        session = ExtractionSession(pdf_path)
+    tables = session.read(read_pages, **kwargs)
+
+    with instrument.stage("format") as record:
+        data = {"first": _format(tables[0].df), "second": _format(tables[1].df)}
+        record["rows"] = sum(len(df) for df in data.values())
 
-    return Table(title, first=_format(tables[0].df), second=_format(tables[1].df))
+    return Table(title, **data)
 
 
 def _format(df):
@@ -1,12 +1,37 @@
 from .table import Table
-import camelot
-import pandas as pd
-import unidecode
+from .. import utils
+from .. import instrument
+from ..session import ExtractionSession
 
-__all__ = ["parse"]
+__all__ = ["get_requests", "parse"]
 
+# the version of this parser, recorded in the processed manifest
+PARSER_VERSION = 1
 
-def parse(title, pdf_path, pages):
+
+def get_requests(pages, pdf_path=None):
+    """
+    Return the pages to read for the Leave Usage Analysis report, and the
+    options to pass to camelot when reading them.
+
+    Parameters
+    ----------
+    pages : list of int
+        the list of page numbers for the table in the report
+    pdf_path : str, optional
+        the path to the PDF; not needed for this table
+
+    Returns
+    -------
+    list of (list of int, dict) :
+        the (one-indexed) pages to read and the camelot read options
+    """
+    if len(pages) < 2:
+        return []
+    return [([pages[1] + 1, pages[1] + 2], {"flavor": "stream"})]
+
+
+def parse(title, pdf_path, pages, session=None):
     """
     Parse the Leave Usage Analysis report in the QCMR.
 
@@ -18,6 +43,9 @@ def parse(title, pdf_path, pages):
         the path to the PDF to read
     pages : list of int
         the list of page numbers for the table in the report
+    session : ExtractionSession, optional
+        the session to read the PDF with; if not provided, a new session
+        is created
 
     Returns
     -------
@@ -26,12 +54,18 @@ def parse(title, pdf_path, pages):
     """
     # get pages of cash forecast data
     assert len(pages) >= 2
-    pages = ",".join(map(str, [pages[1] + 1, pages[1] + 2]))
+    [(read_pages, kwargs)] = get_requests(pages)
 
     # read the PDF
-    tables = camelot.read_pdf(pdf_path, pages=pages, flavor="stream")
+    if session is None:
+        session = ExtractionSession(pdf_path)
+    tables = session.read(read_pages, **kwargs)
+
+    with instrument.stage("format") as record:
+        data = {"quarter_only": _format(tables[0].df), "ytd": _format(tables[1].df)}
+        record["rows"] = sum(len(df) for df in data.values())
 
-    return Table(title, quarter_only=_format(tables[0].df), ytd=_format(tables[1].df))
+    return Table(title, **data)
 
 
 def _format(df):
@@ -39,6 +73,8 @@ def _format(df):
     Internal function to format the parsed data for the leave
     usage analysis report.
     """
+    import unidecode
+
     # extract this part
     idx = df.index[df[0].isin(["Department"])]
     df = df.loc[idx[0] + 1 :].copy()
@@ -49,8 +85,7 @@ def _format(df):
     df = df.drop(labels=df.index[isnull], axis=0)
 
     # slice and convert to floats
-    for col in df.columns[1:]:
-        df[col] = pd.to_numeric(df[col].str.replace("%", ""), errors="coerce")
+    df = utils.convert_to_floats(df, usecols=df.columns[1:])
 
     # remove all NaN rows/columns
     df = df.set_index(df.columns[0])
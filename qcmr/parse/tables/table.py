@@ -2,12 +2,19 @@ import pandas as pd
 import os
 from glob import glob
 
+# the supported file formats and their extensions, in order of preference
+# when reading
+FORMATS = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+
 
 class Table(object):
     """
     A class to represent a table from a PDF, holding one (or more)
     pandas DataFrame objects.
 
+    Tables read from disk load each DataFrame lazily, the first time
+    it is accessed.
+
     Parameters
     ----------
     name : str
@@ -20,36 +27,69 @@ class Table(object):
 
         self.name = name
         self.keys = sorted(data)
-        for k, v in data.items():
-            setattr(self, k, v)
+        self._data = dict(data)
+        self._paths = {}
 
     def __getitem__(self, key):
         if key in self.keys:
-            return getattr(self, key)
+            if key not in self._data:
+                self._data[key] = _read(self._paths[key])
+            return self._data[key]
         else:
             raise KeyError(f"Valid keys are: {self.keys}")
 
+    def __getattr__(self, key):
+        if key.startswith("_") or key not in self.__dict__.get("keys", []):
+            raise AttributeError(key)
+        return self[key]
+
     def __repr__(self):
         return "<Table:%s>" % self.name
 
     def __str__(self):
         return self.name
 
-    def to_file(self, path):
+    def to_file(self, path, format="csv"):
         """
         Write out the table to a series of dataframes
+
+        Parameters
+        ----------
+        path : str
+            the folder to write to
+        format : 'csv', 'parquet', 'feather', optional
+            the file format; the binary columnar formats require pyarrow
         """
+        if format not in FORMATS:
+            raise ValueError(f"Valid formats are: {list(FORMATS)}")
+
         if not os.path.exists(path):
             os.makedirs(path)
 
         # write
         for key in self.keys:
-            self[key].to_csv(os.path.join(path, f"{key}.csv"), index=False)
+            df = self[key]
+            filename = os.path.join(path, key + FORMATS[format])
+            if format == "csv":
+                df.to_csv(filename, index=False)
+            elif format == "parquet":
+                df.to_parquet(filename, index=False)
+            else:
+                df.reset_index(drop=True).to_feather(filename)
+
+            # remove copies in other formats
+            for ext in FORMATS.values():
+                other = os.path.join(path, key + ext)
+                if ext != FORMATS[format] and os.path.exists(other):
+                    os.remove(other)
 
     @classmethod
     def read_file(cls, path):
         """
         Read the Table object from a file.
+
+        Only the names of the available files are read here; the data
+        for each key is loaded when it is first accessed.
         """
         # remove trailing slash
         path = path.rstrip("/")
@@ -58,10 +98,27 @@ class Table(object):
             raise ValueError("Input path should be an existing folder")
 
         name = os.path.basename(path)
-        data = {}
-        for f in glob(os.path.join(path, "*.csv")):
-            key = os.path.splitext(os.path.basename(f))[0]
-            data[key] = pd.read_csv(f)
+        paths = {}
+        for ext in FORMATS.values():
+            for f in glob(os.path.join(path, "*" + ext)):
+                key = os.path.splitext(os.path.basename(f))[0]
+                paths.setdefault(key, f)
+
+        table = cls(name=name)
+        table.keys = sorted(paths)
+        table._paths = paths
+        return table
 
-        return cls(name=name, **data)
 
+def _read(filename):
+    """
+    Internal function to read a DataFrame from a file, based on its
+    extension.
+    """
+    ext = os.path.splitext(filename)[1]
+    if ext == FORMATS["parquet"]:
+        return pd.read_parquet(filename)
+    elif ext == FORMATS["feather"]:
+        return pd.read_feather(filename)
+    else:
+        return pd.read_csv(filename)
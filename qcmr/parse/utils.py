@@ -1,28 +1,301 @@
 from .. import data_dir
 import os
-import PyPDF2
+import re
+import gzip
+import json
+import hashlib
+import tempfile
+import warnings
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-import unidecode
-import pdftotext
 
+# where intermediate, re-creatable results are stored
+cache_dir = os.path.join(data_dir, "cache")
 
-def get_pages(filename, tags, how="all"):
+# the number of lines at the top of each page stored in the page index
+HEADER_LINES = 10
 
-    assert how in ["all", "any"]
+# the file holding manual values for cells missing from parsed tables
+MISSING_VALUES_PATH = os.path.join(data_dir, "missing_values.csv")
+
+# the valid strategies for filling missing values
+MISSING_VALUE_STRATEGIES = ["prompt", "overrides", "totals", "nan", "raise"]
+
+# the maximum number of PDF documents held open at once
+MAX_OPEN_DOCUMENTS = 8
 
+# the pool of open documents, least recently used first
+_documents = OrderedDict()
+
+
+def get_file_hash(filename, blocksize=2 ** 20):
+    """
+    Return the SHA-256 hex digest of the contents of the input file.
+    """
+    sha = hashlib.sha256()
     with open(filename, "rb") as f:
-        pdf = pdftotext.PDF(f)
+        for block in iter(lambda: f.read(blocksize), b""):
+            sha.update(block)
+    return sha.hexdigest()
 
-    def test_page(page, phrases):
-        test = [phrase in page for phrase in phrases]
-        if how == "all":
-            return all(test)
-        else:
-            return any(test)
 
-    out = {}
-    for key in tags:
-        out[key] = [i for i, page in enumerate(pdf) if test_page(page, tags[key])]
+class PDFDocument(object):
+    """
+    A handle to a PDF, with the text of each page extracted by pdftotext
+    only when it is first needed.
+
+    If a page-text index for the PDF exists, text is served from the index
+    and the PDF itself is never opened.
+
+    Parameters
+    ----------
+    filename : str
+        the path to the PDF
+    """
+
+    def __init__(self, filename):
+
+        self.filename = filename
+        self.hash = get_file_hash(filename)
+        self.index_path = os.path.join(cache_dir, "page_index", f"{self.hash}.json.gz")
+
+        self._pdf = None
+        self._text = {}
+        self._index = None
+
+    def __repr__(self):
+        return "<PDFDocument: %s>" % os.path.basename(self.filename)
+
+    def __len__(self):
+        index = self._get_cached_index()
+        if index is not None:
+            return len(index["text"])
+        return len(self._get_pdf())
+
+    def _get_pdf(self):
+        """
+        Internal function to open the PDF with pdftotext.
+        """
+        if self._pdf is None:
+            import pdftotext
+
+            with open(self.filename, "rb") as f:
+                self._pdf = pdftotext.PDF(f)
+        return self._pdf
+
+    def _get_cached_index(self):
+        """
+        Internal function to return the page-text index if it has already
+        been built, or None otherwise.
+        """
+        if self._index is None and os.path.exists(self.index_path):
+            self._index = read_json(self.index_path)
+        return self._index
+
+    def get_text(self, page_num):
+        """
+        Return the text of the input (zero-indexed) page.
+        """
+        index = self._get_cached_index()
+        if index is not None:
+            return index["text"][page_num]
+
+        if page_num not in self._text:
+            self._text[page_num] = self._get_pdf()[page_num]
+        return self._text[page_num]
+
+    def get_index(self):
+        """
+        Return the page-text index for the PDF, building and storing it
+        if necessary.
+
+        Returns
+        -------
+        dict :
+            the index, with the PDF "hash", the "text" of each page, and the
+            first few non-empty lines of each page as "headers"
+        """
+        index = self._get_cached_index()
+        if index is None:
+            text = [self.get_text(i) for i in range(len(self))]
+
+            index = {"hash": self.hash, "text": text, "headers": []}
+            for page in text:
+                lines = [line.strip() for line in page.splitlines() if line.strip()]
+                index["headers"].append(lines[:HEADER_LINES])
+
+            write_json(index, self.index_path)
+
+            # the text is now held by the index
+            self.close()
+            self._index = index
+
+        return index
+
+    def is_blank(self, page_num):
+        """
+        Whether the input (zero-indexed) page has no text; pages that do
+        not exist are considered blank.
+        """
+        if not 0 <= page_num < len(self):
+            return True
+        return self.get_text(page_num).strip() == ""
+
+    def close(self):
+        """
+        Release the PDF, any text extracted from it, and its page-text
+        index; the index is read from disk again if needed.
+        """
+        self._pdf = None
+        self._text = {}
+        self._index = None
+
+
+def open_document(filename):
+    """
+    Return the :class:`PDFDocument` for the input file.
+
+    Documents are kept in a pool of at most :attr:`MAX_OPEN_DOCUMENTS`
+    entries, so repeated calls share the same handle, any text already
+    extracted, and the page-text index. The least recently used document
+    is closed when the pool is full, releasing its text.
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+
+    if key in _documents:
+        _documents.move_to_end(key)
+    else:
+        _documents[key] = PDFDocument(filename)
+        while len(_documents) > MAX_OPEN_DOCUMENTS:
+            _, doc = _documents.popitem(last=False)
+            doc.close()
+
+    return _documents[key]
+
+
+def get_page_index(filename):
+    """
+    Return the page-text index for the input PDF.
+
+    The text of each page is extracted with pdftotext the first time a PDF
+    is seen and stored on disk, keyed by the hash of the PDF contents.
+    Subsequent calls are served from the stored index.
+
+    Parameters
+    ----------
+    filename : str
+        the path to the PDF
+
+    Returns
+    -------
+    dict :
+        the index, with the PDF "hash", the "text" of each page, and the
+        first few non-empty lines of each page as "headers"
+    """
+    return open_document(filename).get_index()
+
+
+def read_json(path):
+    """
+    Read gzipped JSON data from a file.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(data, path):
+    """
+    Atomically write data to a file as gzipped JSON.
+    """
+    dirname = os.path.dirname(path)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    os.close(fd)
+    try:
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def get_pages(filename, tags, how="all", header_lines=None, limits=None):
+    """
+    Find the pages of a PDF that contain the input phrases.
+
+    The phrases for all keys are matched together in a single pass over
+    the pages of the PDF.
+
+    Parameters
+    ----------
+    filename : str
+        the path to the PDF
+    tags : dict
+        a mapping from key to the list of phrases that identify its pages
+    how : 'all', 'any'
+        whether a page must contain all or any of the phrases for a key
+    header_lines : int, optional
+        if provided, only search the first ``header_lines`` non-empty lines
+        of each page
+    limits : dict, optional
+        the expected number of pages for each key; no more than this many
+        pages are returned for a key, and the search stops early once every
+        key has found its expected pages
+
+    Returns
+    -------
+    dict :
+        a mapping from key to the list of (zero-indexed) page numbers
+    """
+    assert how in ["all", "any"]
+    if limits is None:
+        limits = {}
+
+    # one pattern for all phrases, longest first; the lookahead allows
+    # overlapping matches
+    phrases = sorted(set(sum(map(list, tags.values()), [])), key=len, reverse=True)
+    pattern = re.compile("(?=(%s))" % "|".join(map(re.escape, phrases)))
+
+    # a match for a phrase implies matches for any phrases it contains
+    implied = {p: {q for q in phrases if q in p} for p in phrases}
+
+    index = get_page_index(filename)
+    stop_early = len(tags) > 0 and all(key in limits for key in tags)
+
+    out = {key: [] for key in tags}
+    for i, text in enumerate(index["text"]):
+
+        # the region of the page to search
+        if header_lines is not None:
+            if header_lines <= HEADER_LINES:
+                lines = index["headers"][i][:header_lines]
+            else:
+                lines = [l.strip() for l in text.splitlines() if l.strip()]
+                lines = lines[:header_lines]
+            text = "\n".join(lines)
+
+        found = set()
+        for match in pattern.finditer(text):
+            found |= implied.get(match.group(1), set())
+        if not found:
+            continue
+
+        for key in tags:
+            if key in limits and len(out[key]) >= limits[key]:
+                continue
+
+            test = [phrase in found for phrase in tags[key]]
+            if all(test) if how == "all" else any(test):
+                out[key].append(i)
+
+        # stop once every key has its expected pages
+        if stop_early and all(len(out[key]) >= limits[key] for key in tags):
+            break
 
     return out
 
@@ -44,21 +317,57 @@ def get_raw_PDF_path(fiscalYear, quarter):
 
 
 def sanitize_strings(x):
+    import unidecode
+
     return unidecode.unidecode(x).replace("\n", "")
 
 
+def to_float_array(values, errors="coerce"):
+    """
+    Convert a block of strings in currency or percent format to floats
+    in a single vectorized pass.
+
+    Dollar signs, commas, percent signs, and whitespace are removed, and
+    values in parentheses are treated as negative. Blank cells and "."
+    placeholders become NaN.
+
+    Parameters
+    ----------
+    values : DataFrame, array_like
+        the 2D block of values to convert
+    errors : 'coerce', 'raise'
+        whether values that cannot be parsed become NaN or raise an error
+
+    Returns
+    -------
+    ndarray :
+        the float64 array, with the same shape as the input
+    """
+    assert errors in ["coerce", "raise"]
+
+    values = np.asarray(values, dtype=object)
+    flat = pd.Series(values.ravel(), dtype=object).fillna("").astype(str)
+
+    flat = flat.str.replace(r"[\$,%)\s]", "", regex=True).str.replace(
+        "(", "-", regex=False
+    )
+    flat = flat.mask(flat.isin(["", "."]))
+
+    out = pd.to_numeric(flat, errors=errors).to_numpy(dtype="f8")
+    return out.reshape(values.shape)
+
+
 def convert_to_floats(df, usecols=None, errors="coerce"):
     """
     Convert string values in currency format to floats.
     """
     if usecols is None:
         usecols = df.columns
+    usecols = list(usecols)
 
-    for col in usecols:
-        df[col] = pd.to_numeric(
-            df[col].replace("[\$,)]", "", regex=True).replace("[(]", "-", regex=True),
-            errors=errors,
-        )
+    values = to_float_array(df[usecols], errors=errors)
+    for i, col in enumerate(usecols):
+        df[col] = values[:, i]
     return df
 
 
@@ -66,11 +375,8 @@ def remove_empty_columns(df):
     """
     Drop any empty columns from the dataframe
     """
-    for col in df.columns:
-        invalid = df[col].isin(["", "."]).all()
-        if invalid:
-            df = df.drop(labels=[col], axis=1)
-    return df
+    invalid = df.isin(["", "."]).all(axis=0)
+    return df.drop(labels=df.columns[invalid.values], axis=1)
 
 
 def find_page(fiscalYear, quarter, tags, how="all"):
@@ -80,49 +386,30 @@ def find_page(fiscalYear, quarter, tags, how="all"):
     assert how in ["all", "any"]
     assert isinstance(tags, list)
 
-    # load the filename
-    filename = get_raw_PDF_path(fiscalYear, quarter)
-
-    with open(filename, "rb") as ff:
-
-        pdf_reader = PyPDF2.PdfFileReader(ff)
-        page_num = 0
-        stop_page = pdf_reader.getNumPages()
+    # load the document
+    doc = open_document(get_raw_PDF_path(fiscalYear, quarter))
 
-        matches = []
-        while page_num < stop_page:
-            page = pdf_reader.getPage(page_num)
-            try:
-                text = page.extractText()
-                text = text.replace("\n", " ")
-            except:
-                pass
+    matches = []
+    for page_num in range(len(doc)):
+        text = doc.get_text(page_num).replace("\n", " ")
 
-            test = [tag in text for tag in tags]
-            if how == "all":
-                test = all(test)
-            else:
-                test = any(test)
+        test = [tag in text for tag in tags]
+        if how == "all":
+            test = all(test)
+        else:
+            test = any(test)
 
-            if test:
-                matches.append(page_num)
-            page_num += 1
+        if test:
+            matches.append(page_num)
 
     return matches
 
 
 def page_is_blank(fiscalYear, quarter, page_num):
 
-    # load the filename
-    filename = get_raw_PDF_path(fiscalYear, quarter)
-    with open(filename, "rb") as ff:
-        pdf_reader = PyPDF2.PdfFileReader(ff)
-        try:
-            page = pdf_reader.getPage(page_num)
-            text = page.extractText()
-        except:
-            return True
-        return text == ""
+    # load the document
+    doc = open_document(get_raw_PDF_path(fiscalYear, quarter))
+    return doc.is_blank(page_num)
 
 
 def get_fiscal_months():
@@ -143,14 +430,157 @@ def get_fiscal_months():
     ]
 
 
-def fill_missing_values(df):
-    for index, row in df.iterrows():
-        idx = row.isnull()
-        if idx.sum():
-            missing = row.index[idx]
-            for col in missing:
-                prompt = f"Input missing value for category='{row['category']}' and column = '{col}': "
-                value = float(input(prompt))
-                row[col] = value
+def find_missing_values(df):
+    """
+    Return the (category, column) of every missing value in a formatted
+    table, found with a single mask over the data columns.
+    """
+    cols = df.columns.drop("category")
+    rows, columns = np.nonzero(df[cols].isnull().to_numpy())
+    categories = df["category"].to_numpy()
+    return [(categories[i], cols[j]) for i, j in zip(rows, columns)]
+
+
+def fill_missing_values(df, how="prompt", tag=None, table=None, totals=None):
+    """
+    Fill missing values in a formatted table.
+
+    Parameters
+    ----------
+    df : DataFrame
+        the formatted table, with a "category" column and a column per month
+    how : str, list of str
+        the strategy, or list of strategies tried in order, for filling
+        missing values:
+
+        - 'prompt': ask for each missing value
+        - 'overrides': look up values in the overrides file, keyed by
+          (tag, table, category, month)
+        - 'totals': derive values from the totals in the table
+        - 'nan': leave any remaining values missing
+        - 'raise': raise an error listing any remaining missing values
+    tag : str, optional
+        the tag of the report, e.g., 'FY20_Q2'; needed for 'overrides'
+    table : str, optional
+        the name of the table, e.g., 'gf_revenue'; needed for 'overrides'
+    totals : dict, optional
+        mapping from the name of each total to the names of its components;
+        needed for 'totals'
+
+    Returns
+    -------
+    DataFrame :
+        the table with missing values filled
+
+    Warns
+    -----
+    UserWarning :
+        a single warning per table, listing the cells that were filled and
+        the cells that were left missing
+    """
+    strategies = [how] if isinstance(how, str) else list(how)
+    for strategy in strategies:
+        assert strategy in MISSING_VALUE_STRATEGIES, f"invalid strategy '{strategy}'"
+
+    missing = find_missing_values(df)
+    if not len(missing):
+        return df
+
+    df = df.reset_index(drop=True)
+    initial = missing
+    for strategy in strategies:
+
+        if strategy == "nan":
+            break
+        elif strategy == "raise":
+            raise ValueError(
+                f"{len(missing)} missing values for tag={tag}, table={table}: {missing}"
+            )
+        elif strategy == "overrides":
+            df = _fill_from_overrides(df, tag, table)
+        elif strategy == "totals":
+            df = _fill_from_totals(df, totals)
+        else:
+            for category, col in missing:
+                prompt = f"Input missing value for category='{category}' and column = '{col}': "
+                df.loc[df["category"] == category, col] = float(input(prompt))
+
+        missing = find_missing_values(df)
+        if not len(missing):
+            break
+
+    # report every cell that was filled or left missing
+    filled = [cell for cell in initial if cell not in missing]
+    warnings.warn(
+        f"missing values for tag={tag}, table={table}: "
+        f"filled {len(filled)} {filled}; left {len(missing)} missing {missing}"
+    )
 
     return df
+
+
+def _fill_from_overrides(df, tag, table):
+    """
+    Internal function to fill missing values from the overrides file.
+    """
+    assert tag is not None and table is not None
+
+    overrides = pd.read_csv(MISSING_VALUES_PATH)
+    overrides = overrides.loc[(overrides["tag"] == tag) & (overrides["table"] == table)]
+
+    isnull = df.isnull()
+    for _, row in overrides.iterrows():
+        sel = isnull[row["month"]] & (df["category"] == row["category"])
+        df.loc[sel, row["month"]] = row["value"]
+
+    return df
+
+
+def _fill_from_totals(df, totals, atol=1.0):
+    """
+    Internal function to derive missing values from the totals in a table.
+
+    A missing value is filled whenever it is the only missing value in a
+    total or its components for a given month, repeating until no more
+    values can be derived. A total is only used if it matches the sum of
+    its components in every month where they are all present, so a
+    mismatched layout is never used to derive values.
+    """
+    assert totals is not None
+
+    X = df.set_index("category")
+
+    # only use the totals that hold in the fully observed months
+    valid = {}
+    for total, components in totals.items():
+        if total not in X.index:
+            continue
+        components = [c for c in components if c in X.index]
+
+        values = X.loc[components + [total]]
+        complete = values.columns[values.notnull().all(axis=0)]
+        values = values[complete]
+        diff = (values.loc[components].sum() - values.loc[total]).abs()
+        if len(complete) and not (diff > atol).any():
+            valid[total] = components
+
+    filled = True
+    while filled:
+        filled = False
+        for total, components in valid.items():
+            values = X.loc[components]
+            isnull = values.isnull()
+            for month in X.columns[isnull.any(axis=0) | X.loc[total].isnull()]:
+                nmissing = isnull[month].sum() + int(pd.isnull(X.at[total, month]))
+                if nmissing != 1:
+                    continue
+
+                if pd.isnull(X.at[total, month]):
+                    X.at[total, month] = round(values[month].sum(), 6)
+                else:
+                    category = isnull.index[isnull[month]][0]
+                    value = X.at[total, month] - values[month].sum()
+                    X.at[category, month] = round(value, 6)
+                filled = True
+
+    return X.reset_index()
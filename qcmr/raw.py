@@ -1,103 +1,332 @@
 from .parse import utils
 from .parse.tables.table import Table
 from . import data_dir
-from .parse import *
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import os
 import re
-import calendar
+import json
+import hashlib
 from glob import glob
 
+# the maximum number of files to read at the same time
+MAX_READ_WORKERS = 8
+
 
 def load_leave_usage():
 
-    all_data = []
     files = glob(os.path.join(data_dir, "processed", "leave_usage", "FY*_Q*.csv"))
+    all_data = read_files(sorted(files), pd.read_csv)
 
-    for f in sorted(files):
-        tag = os.path.basename(f)
-        matches = re.search("FY(?P<year>[0-9]{2})_Q(?P<quarter>[1234])", tag)
-        year = int("20" + matches.group("year"))
-        quarter = int(matches.group("quarter"))
+    return pd.concat(all_data)
 
-        df = pd.read_csv(f)
-        df["fiscal_year"] = year
-        df["quarter"] = quarter
 
-        all_data.append(df)
+def read_files(files, reader, max_workers=None):
+    """
+    Read many processed files concurrently, tagging each with the fiscal
+    year and quarter from its path.
+
+    Parameters
+    ----------
+    files : list of str
+        the files to read; each path must include a "FY??_Q?" tag
+    reader : callable
+        the function that reads a single file into a DataFrame
+    max_workers : int, optional
+        the maximum number of files to read at the same time; default is
+        :attr:`MAX_READ_WORKERS`
+
+    Returns
+    -------
+    list of DataFrame :
+        the data from each file, in the same order as the input files
+    """
+    if not len(files):
+        return []
+    if max_workers is None:
+        max_workers = MAX_READ_WORKERS
+
+    def read(f):
+        matches = re.search("FY(?P<year>[0-9]{2})_Q(?P<quarter>[1234])", f)
+        df = reader(f)
+        df["fiscal_year"] = int("20" + matches.group("year"))
+        df["quarter"] = int(matches.group("quarter"))
+        return df
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(files))) as ex:
+        return list(ex.map(read, files))
+
+
+# the kinds of cash forecast data
+CASH_FORECAST_KINDS = ["gf_revenue", "gf_spending", "gf_balance_sheet", "fund_balances"]
+
+
+def get_cash_forecast_store_path(kind):
+    """
+    Return the path to the consolidated store of cash forecast data for
+    the input kind.
+
+    The stores are derived from the quarterly processed files, so they
+    are kept in the cache folder rather than with the processed data.
+    """
+    return os.path.join(utils.cache_dir, "cash_forecasts", f"{kind}.csv")
 
-    return pd.concat(all_data)
+
+def get_cash_forecast_fingerprint(kind):
+    """
+    Return a fingerprint of the quarterly processed files for a kind of
+    cash forecast data, from the name, size, and modification time of
+    each file.
+
+    The fingerprint changes whenever a quarterly file is added, removed,
+    or modified.
+    """
+    stats = json.dumps(_get_file_stats(kind), sort_keys=True)
+    return hashlib.sha256(stats.encode("utf-8")).hexdigest()
 
 
 def load_cash_forecasts(kind):
+    """
+    Load the cash forecast data for all quarters.
+
+    Data is read from the consolidated store for the input kind, which is
+    rebuilt from the quarterly processed files if it does not exist, or if
+    those files changed since it was built.
+
+    Parameters
+    ----------
+    kind : str
+        the kind of data; one of "gf_revenue", "gf_spending",
+        "gf_balance_sheet", "fund_balances"
+
+    Returns
+    -------
+    DataFrame :
+        the data, with a column for each category, and the "fiscal_year",
+        "quarter", and "month" of each row
+    """
+    assert kind in CASH_FORECAST_KINDS
+
+    path = get_cash_forecast_store_path(kind)
+    if _is_store_stale(kind):
+        rebuild_cash_forecast_store(kinds=[kind])
+
+    df = (
+        pd.read_csv(path)
+        .set_index(["fiscal_year", "quarter", "month", "category"])["value"]
+        .unstack("category")
+        .rename_axis(None, axis=1)
+        .reset_index()
+    )
+
+    # sort by fiscal month within each quarter
+    fiscal_month = (df["month"] - 7) % 12
+    df = df.iloc[np.lexsort([fiscal_month, df["quarter"], df["fiscal_year"]])]
+
+    return df[sorted(df.columns)].reset_index(drop=True)
+
+
+def update_cash_forecast_store(year, quarter, table=None):
+    """
+    Replace the data for a single quarter in the consolidated cash forecast
+    stores.
+
+    Parameters
+    ----------
+    year : int
+        the fiscal year of the report
+    quarter : int
+        the fiscal quarter of the report
+    table : Table, optional
+        the parsed cash forecast; if not provided, it is read from the
+        processed files for the quarter
+    """
+    if table is None:
+        FY = utils.get_FY_abbreviation(year)
+        path = os.path.join(
+            data_dir, "processed", f"FY{FY}_Q{quarter}", "Cash Flow Forecast"
+        )
+        table = Table.read_file(path)
+
+    for kind in CASH_FORECAST_KINDS:
+        path = get_cash_forecast_store_path(kind)
 
-    assert kind in ["gf_revenue", "gf_spending", "gf_balance_sheet", "fund_balances"]
+        # rebuild everything if other quarters changed too
+        if _is_store_stale(kind, ignore=(year, quarter)):
+            rebuild_cash_forecast_store(kinds=[kind])
+            continue
+
+        store = pd.read_csv(path)
+        this_quarter = (store["fiscal_year"] == year) & (store["quarter"] == quarter)
+        store = pd.concat(
+            [store.loc[~this_quarter], _to_long(table[kind], year, quarter)], axis=0
+        )
+        _write_store(store, kind)
+
+
+def rebuild_cash_forecast_store(kinds=None):
+    """
+    Rebuild the consolidated cash forecast stores from the processed files
+    for every quarter.
+
+    Parameters
+    ----------
+    kinds : list of str, optional
+        the kinds of data to rebuild; default is all kinds
+    """
+    if kinds is None:
+        kinds = CASH_FORECAST_KINDS
+
+    for kind in kinds:
+        df = _read_quarterly_cash_forecasts(kind)
+        _write_store(df, kind)
+
+
+def _is_store_stale(kind, ignore=None):
+    """
+    Internal function to test whether the consolidated store for a kind is
+    missing, or was built from quarterly processed files that have since
+    changed.
+
+    If provided, changes to the files of the (fiscal year, quarter) given
+    by ``ignore`` are not counted.
+    """
+    path = get_cash_forecast_store_path(kind)
+    meta_path = _get_metadata_path(kind)
+    if not os.path.exists(path) or not os.path.exists(meta_path):
+        return True
+
+    with open(meta_path, "r") as f:
+        built_from = json.load(f)["files"]
+    current = _get_file_stats(kind)
+
+    if ignore is not None:
+        tag = f"FY{utils.get_FY_abbreviation(ignore[0])}_Q{ignore[1]}"
+        built_from = {f: v for f, v in built_from.items() if not f.startswith(tag)}
+        current = {f: v for f, v in current.items() if not f.startswith(tag)}
+
+    return built_from != current
+
+
+def _get_file_stats(kind):
+    """
+    Internal function to return the [size, modification time] of each
+    quarterly processed file for a kind, keyed by its path relative to the
+    processed data folder.
+    """
+    processed = os.path.join(data_dir, "processed")
+    pattern = os.path.join(processed, "FY*_Q*", "Cash Flow Forecast", f"{kind}.*")
+
+    out = {}
+    for f in glob(pattern):
+        stat = os.stat(f)
+        out[os.path.relpath(f, processed)] = [stat.st_size, stat.st_mtime_ns]
+    return out
 
-    month_dict = dict((v, k) for k, v in enumerate(calendar.month_abbr))
 
+def _get_metadata_path(kind):
+    """
+    Internal function to return the path of the file recording the inputs
+    of the consolidated store for a kind.
+    """
+    return os.path.splitext(get_cash_forecast_store_path(kind))[0] + ".json"
+
+
+def _read_quarterly_cash_forecasts(kind):
+    """
+    Internal function to read the processed cash forecast files of every
+    quarter for a kind, in long format.
+
+    The wide quarterly frames are read concurrently and concatenated, and
+    then reshaped in a single pass.
+    """
     files = glob(os.path.join(data_dir, "processed", "FY*_Q*", "Cash Flow Forecast"))
+    all_data = read_files(sorted(files), lambda f: Table.read_file(f)[kind])
 
-    all_data = []
-    for f in sorted(files):
-        matches = re.search("FY(?P<year>[0-9]{2})_Q(?P<quarter>[1234])", f)
-        year = int("20" + matches.group("year"))
-        quarter = int(matches.group("quarter"))
+    return _to_long(pd.concat(all_data, axis=0, ignore_index=True))
 
-        df = Table.read_file(f)[kind]
+
+def _to_long(df, year=None, quarter=None):
+    """
+    Internal function to convert cash forecast data from one column per
+    month to one row per (month, category).
+
+    If provided, the input year and quarter are assigned to all rows;
+    otherwise, the data must have "fiscal_year" and "quarter" columns.
+    """
+    df = df.copy()
+    if year is not None:
         df["fiscal_year"] = year
+    if quarter is not None:
         df["quarter"] = quarter
 
-        df = (
-            df.set_index(["fiscal_year", "quarter", "category"])
-            .rename_axis(["month"], axis=1)
-            .stack()
-            .unstack(["category"])
-            .reset_index()
-            .rename_axis([None], axis=1)
-            .sort_values(["fiscal_year", "quarter"], ascending=True)
-        )
-        df["month"] = df["month"].apply(lambda x: month_dict[x.capitalize()])
+    df = df.melt(
+        id_vars=["fiscal_year", "quarter", "category"],
+        value_vars=utils.get_fiscal_months(),
+        var_name="month",
+        value_name="value",
+    )
 
-        all_data.append(df)
+    # month names to calendar month numbers, via fiscal month codes
+    codes = pd.Categorical(df["month"], categories=utils.get_fiscal_months()).codes
+    df["month"] = (codes + 6) % 12 + 1
 
-    return pd.concat(all_data, sort=True).reset_index(drop=True)
+    return df[["fiscal_year", "quarter", "month", "category", "value"]]
 
 
-def process_qcmr(fiscalYear, quarter, tables=["cash", "leave_usage"]):
+def _write_store(df, kind):
+    """
+    Internal function to write the consolidated store for a kind, sorted,
+    replacing any existing file atomically, along with the stats of the
+    quarterly files it was built from.
+    """
+    path = get_cash_forecast_store_path(kind)
+    dirname = os.path.dirname(path)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname, exist_ok=True)
 
-    # make sure we have the raw data file
-    raw_filename = utils.get_raw_PDF_path(fiscalYear, quarter)
-    if not os.path.exists(raw_filename):
-        raise ValueError(
-            f"no QCMR found for fiscal year {fiscalYear} and quarter {quarter}"
-        )
+    df = df.sort_values(["fiscal_year", "quarter", "category", "month"])
 
-    # get the filename
-    FY = utils.get_FY_abbreviation(fiscalYear)
-    filename = f"FY{FY}_Q{quarter}.csv"
-
-    # get the pages
-    pages = utils.get_pages(
-        raw_filename,
-        {
-            "leave_usage": ["TOTAL LEAVE USAGE ANALYSIS"],
-            "cash": ["CASH FLOW PROJECTIONS"],
-        },
-    )
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+    meta_path = _get_metadata_path(kind)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump({"files": _get_file_stats(kind)}, f, indent=2, sort_keys=True)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def process_qcmr(fiscalYear, quarter, tables=None, fresh=True, missing="prompt"):
+    """
+    Process tables from a single QCMR report.
+
+    Parameters
+    ----------
+    fiscalYear : int
+        the fiscal year of the report
+    quarter : int
+        the fiscal quarter of the report
+    tables : list of str, optional
+        the tables to process; default is all tables in :attr:`QCMR.tables`
+    fresh : bool, optional
+        whether to re-parse tables that have already been processed
+    missing : str, list of str, optional
+        the strategies for filling missing values
+
+    Returns
+    -------
+    QCMR :
+        the processed report
+    """
+    from .parse.core import QCMR
 
-    # process and save cash results
-    if "cash" in tables:
-        print("  Processing cash report...")
-        dfs = get_cash_flow_forecast(raw_filename, pages["cash"])
-        tags = ["gf_revenue", "gf_spending", "gf_balance_sheet", "fund_balances"]
-        for i, tag in enumerate(tags):
-            path = os.path.join(data_dir, "processed", "cash", tag, filename)
-            dfs[i].to_csv(path)
-
-    # process and save leave usage results
-    if "leave_usage" in tables:
-        print("  Processing leave usage report...")
-        df = get_leave_usage(raw_filename, pages["leave_usage"])
-        path = os.path.join(data_dir, "processed", "leave_usage", filename)
-        df.to_csv(path)
+    # the names used by earlier versions
+    aliases = {"cash": "cash_forecast"}
+    if tables is not None:
+        tables = [aliases.get(table, table) for table in tables]
 
+    report = QCMR(fiscalYear, quarter, missing=missing)
+    report.process(tables=tables, fresh=fresh)
+    return report
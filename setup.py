@@ -20,4 +20,5 @@ setup(
     description="Digitizing the City of Philadelphia's Quarterly City Manager's Report",
     license="MIT",
     packages=find_packages(),
+    entry_points={"console_scripts": ["qcmr=qcmr.cli:main"]},
 )